@@ -0,0 +1,194 @@
+"""
+Command line batch analyzer. Streams positions out of EPD and PGN files, searches them on a pool of processes with
+SmartMoveFinder and writes one JSON line per position with the best move and its score. Run from the Chess folder:
+    python BatchAnalyzer.py positions.epd games.pgn [--depth N | --movetime S] [--workers N] [--output results.jsonl]
+Files are read lazily one line at a time and at most a few positions per process are in flight, so memory stays flat
+however large the input is. Throughput in positions per second is reported on stderr.
+Every result has the source file, the position number in it (or the game and ply of a PGN position), the FEN,
+bestmove and score (pawns, for the side to move), the pv, the depth (last completed iteration), nodes and seconds of
+the search. The score is null when the budget ran out before the first iteration finished.
+"""
+import argparse
+import json
+import os
+import re
+import sys
+import threading
+import time
+from multiprocessing import Pool
+import ChessEngine
+import SmartMoveFinder
+
+DEFAULT_DEPTH = 3
+IN_FLIGHT_PER_WORKER = 8 #positions read ahead per process
+REPORT_INTERVAL = 10 #seconds between two throughput reports
+
+#PGN movetext that isn't a move: comments, variations, move numbers, annotation glyphs and results
+pgnNoisePattern = re.compile(r"\{[^}]*\}|;[^\n]*|\$\d+|\d+\.(\.\.)?|1-0|0-1|1/2-1/2|\*")
+pgnHeaderPattern = re.compile(r'^\[(\w+)\s+"(.*)"\]\s*$')
+
+
+"""
+Yields (position number, FEN, EPD operations) for every position line of an EPD file
+"""
+def read_epd_positions(path):
+    with open(path) as epdFile:
+        number = 0
+        for line in epdFile:
+            fields = line.split(maxsplit=4)
+            if len(fields) < 4 or line.startswith("#"):
+                continue
+            number += 1
+            yield number, " ".join(fields[:4]), fields[4].strip() if len(fields) == 5 else ""
+
+"""
+Yields (headers dictionary, list of SAN moves) for every game of a PGN file
+"""
+def read_pgn_games(path):
+    with open(path) as pgnFile:
+        headers = {}
+        moveText = []
+        for line in pgnFile:
+            header = pgnHeaderPattern.match(line)
+            if header:
+                if moveText: #a header right after the moves starts the next game
+                    yield headers, split_move_text(" ".join(moveText))
+                    headers, moveText = {}, []
+                headers[header.group(1)] = header.group(2)
+            elif line.strip():
+                moveText.append(line.strip())
+            elif moveText: #blank line after the moves ends the game
+                yield headers, split_move_text(" ".join(moveText))
+                headers, moveText = {}, []
+        if moveText or headers:
+            yield headers, split_move_text(" ".join(moveText))
+
+"""
+Returns the SAN moves of the main line of a PGN movetext
+"""
+def split_move_text(moveText):
+    mainLine = []
+    variationDepth = 0
+    for part in re.split(r"([()])", pgnNoisePattern.sub(" ", moveText)):
+        if part == "(":
+            variationDepth += 1
+        elif part == ")":
+            variationDepth -= 1
+        elif variationDepth == 0:
+            mainLine.extend(part.split())
+    return mainLine
+
+"""
+Yields (game number, ply, FEN) for the positions of every game of a PGN file, every pgnEvery plies starting with
+the position before the first move. A game with a move that can't be read is cut off there.
+"""
+def read_pgn_positions(path, pgnEvery=1):
+    for gameNumber, (headers, sanMoves) in enumerate(read_pgn_games(path), start=1):
+        try:
+            gs = ChessEngine.GameState.from_fen(headers["FEN"]) if "FEN" in headers else ChessEngine.GameState()
+        except ValueError as e:
+            print(f"{path} game {gameNumber}: {e}", file=sys.stderr)
+            continue
+        for ply in range(len(sanMoves) + 1):
+            if ply % pgnEvery == 0:
+                yield gameNumber, ply, gs.to_fen()
+            if ply == len(sanMoves):
+                break
+            try:
+                gs.make_move(gs.parse_san(sanMoves[ply]))
+            except ValueError as e:
+                print(f"{path} game {gameNumber} ply {ply + 1}: {e}", file=sys.stderr)
+                break
+
+"""
+Yields one job dictionary per position of all the input files, .pgn files are read as PGN and anything else as EPD
+"""
+def read_jobs(paths, pgnEvery):
+    for path in paths:
+        if path.lower().endswith(".pgn"):
+            for gameNumber, ply, fen in read_pgn_positions(path, pgnEvery):
+                yield {"source": path, "game": gameNumber, "ply": ply, "fen": fen}
+        else:
+            for number, fen, operations in read_epd_positions(path):
+                job = {"source": path, "position": number, "fen": fen}
+                if operations:
+                    job["epd"] = operations
+                yield job
+
+"""
+Task of the pool processes: searches the position of a job and returns the job with the results added
+"""
+def analyze_position(job, maxDepth, timeLimit, nodeLimit):
+    result = dict(job)
+    try:
+        gs = ChessEngine.GameState.from_fen(job["fen"])
+    except ValueError as e:
+        result["error"] = str(e)
+        return result
+    startTime = time.perf_counter()
+    validMoves = gs.get_valid_moves()
+    if validMoves:
+        bestMove, score, pv = SmartMoveFinder.iterative_deepening(gs, validMoves, maxDepth, timeLimit, nodeLimit)
+    else:
+        bestMove, score, pv = None, -SmartMoveFinder.CHECKMATE if gs.checkMate else 0, []
+    depth = SmartMoveFinder.lastSearchStats.depth if validMoves else 0 #last completed iteration
+    result["bestmove"] = bestMove.get_chess_notation() if bestMove is not None else None
+    #no score when the budget ran out before the first iteration finished, -CHECKMATE would read as a mate
+    result["score"] = round(score, 2) if depth > 0 or not validMoves else None
+    result["pv"] = [move.get_chess_notation() for move in pv]
+    result["depth"] = depth
+    result["nodes"] = SmartMoveFinder.nodeCount if validMoves else 0
+    result["seconds"] = round(time.perf_counter() - startTime, 4)
+    return result
+
+def analyze_job(arguments):
+    return analyze_position(*arguments)
+
+"""
+Passes the items of iterable on, but waits on the semaphore before each one, so a Pool reading it stays only as far
+ahead of the results as the semaphore allows
+"""
+def bounded(iterable, semaphore):
+    for item in iterable:
+        semaphore.acquire()
+        yield item
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Analyze the positions of EPD and PGN files")
+    parser.add_argument("files", nargs="+", help=".epd or .pgn files")
+    parser.add_argument("--depth", type=int, default=None, help=f"search depth (default {DEFAULT_DEPTH})")
+    parser.add_argument("--movetime", type=float, default=None, help="seconds per position")
+    parser.add_argument("--nodes", type=int, default=None, help="nodes per position")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--pgn-every", type=int, default=1, help="analyze every Nth ply of PGN games")
+    parser.add_argument("--output", default=None, help="JSONL file to write, default stdout")
+    args = parser.parse_args()
+    maxDepth = args.depth
+    if maxDepth is None:
+        #a time or node budget alone searches as deep as it gets
+        maxDepth = SmartMoveFinder.MAX_PLY // 2 if args.movetime or args.nodes else DEFAULT_DEPTH
+
+    output = open(args.output, "w") if args.output else sys.stdout
+    inFlight = threading.Semaphore(args.workers * IN_FLIGHT_PER_WORKER)
+    jobs = ((job, maxDepth, args.movetime, args.nodes) for job in read_jobs(args.files, args.pgn_every))
+    positions = 0
+    startTime = lastReport = time.perf_counter()
+    with Pool(args.workers) as pool:
+        for result in pool.imap(analyze_job, bounded(jobs, inFlight)):
+            inFlight.release()
+            output.write(json.dumps(result) + "\n")
+            output.flush()
+            positions += 1
+            now = time.perf_counter()
+            if now - lastReport >= REPORT_INTERVAL:
+                lastReport = now
+                print(f"{positions} positions  {positions / (now - startTime):.1f} positions/s", file=sys.stderr)
+    elapsed = time.perf_counter() - startTime
+    print(f"{positions} positions in {elapsed:.2f}s  {positions / max(elapsed, 1e-9):.1f} positions/s", file=sys.stderr)
+    if output is not sys.stdout:
+        output.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Vectorized piece-square evaluation of many positions at once, for the leaf batching mode of the search and for
+offline jobs that score large numbers of positions.
+Boards are rows of 64 int8 piece codes (a8 first, the ChessEngine codes, the same bytes as PositionSnapshot.board),
+stacked into an N x 64 array. The scores are the ones SmartMoveFinder.score_piece_squares gives, in pawns and
+positive when white is better; checkmate and stalemate are not detected.
+NumPy is optional: without it available() is False and the search never batches.
+"""
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from ChessEngine import SQUARE_120, BLACK, KING, midgameScores, endgameScores, phaseWeights
+from PieceSquareTables import MAX_PHASE
+
+#[piece code, 8x8 square] lookup tables built from the ChessEngine piece-square tables
+if np is not None:
+    midgameTable = np.zeros(((BLACK | KING) + 1, 64), dtype=np.int32)
+    endgameTable = np.zeros(((BLACK | KING) + 1, 64), dtype=np.int32)
+    phaseTable = np.zeros((BLACK | KING) + 1, dtype=np.int32)
+    for piece in midgameScores:
+        midgameTable[piece] = [midgameScores[piece][sq] for sq in SQUARE_120]
+        endgameTable[piece] = [endgameScores[piece][sq] for sq in SQUARE_120]
+        phaseTable[piece] = phaseWeights[piece]
+    squareIndexes = np.arange(64)
+
+
+def available():
+    return np is not None
+
+"""
+Stacks boards given as 64 byte strings (GameState.board_bytes or PositionSnapshot.board) into an N x 64 int8 array
+"""
+def stack_boards(boards):
+    return np.frombuffer(b"".join(boards), dtype=np.int8).reshape(-1, 64)
+
+"""
+Scores an N x 64 int8 array of boards (or a list of 64 byte boards), returns a float array of N scores
+"""
+def evaluate_boards(boards):
+    if not isinstance(boards, np.ndarray):
+        boards = stack_boards(boards)
+    pieces = boards.astype(np.intp)
+    midgame = midgameTable[pieces, squareIndexes].sum(axis=1)
+    endgame = endgameTable[pieces, squareIndexes].sum(axis=1)
+    phase = np.minimum(phaseTable[pieces].sum(axis=1), MAX_PHASE)
+    return (midgame * phase + endgame * (MAX_PHASE - phase)) / (100 * MAX_PHASE)
+
+"""
+Scores a list of GameStates in one batch
+"""
+def evaluate_game_states(gameStates):
+    return evaluate_boards([gs.board_bytes() for gs in gameStates])
@@ -1,9 +1,142 @@
-""" 
-This class is responsible for storing all the information about the current state of a chess game. 
-It will also be responsible for determining the valid moves at the curent state. It will also keep a move log. 
 """
+This class is responsible for storing all the information about the current state of a chess game.
+It will also be responsible for determining the valid moves at the curent state. It will also keep a move log.
+"""
+import random
+import re
+from collections import namedtuple
+import PieceSquareTables
+
+#Pieces are small ints: a color bit (WHITE or BLACK) or'ed with the piece type.
+#A square that holds neither color bit is empty (EMPTY) or outside of the board (OFFBOARD).
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+TYPE_MASK = 7 #piece & TYPE_MASK is the piece type
+WHITE = 8
+BLACK = 16
+OFFBOARD = 32
+
+#names used by the GUI and the old 8x8 board of strings
+pieceNames = {EMPTY: "--"}
+for color, colorName in ((WHITE, 'w'), (BLACK, 'b')):
+    for pieceType, typeName in ((PAWN, 'p'), (KNIGHT, 'N'), (BISHOP, 'B'), (ROOK, 'R'), (QUEEN, 'Q'), (KING, 'K')):
+        pieceNames[color | pieceType] = colorName + typeName
+pieceCodes = {name: piece for piece, name in pieceNames.items()}
+#FEN letters: upper case for white, lower case for black
+fenLetters = {piece: (name[1].upper() if piece & WHITE else name[1].lower()) for piece, name in pieceNames.items() if piece != EMPTY}
+fenPieces = {letter: piece for piece, letter in fenLetters.items()}
+START_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+#move in standard algebraic notation: piece, from file, from rank, x, to square, promotion
+sanPattern = re.compile(r"^([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(=?[NBRQ])?$")
+PIECES = [piece for piece in pieceNames if piece != EMPTY]
+
+#The board is a 10x12 mailbox: the 8x8 board with two rows of OFFBOARD squares above and below and one column of
+#OFFBOARD squares on each side, so a piece walking off the board always lands on an OFFBOARD square (knights too).
+#Row 0 / column 0 of the 8x8 board (a8) is index 21, moving one row down adds 10 and one column right adds 1.
+SQUARE_120 = [21 + (sq // 8) * 10 + sq % 8 for sq in range(64)] #8x8 index (row * 8 + col) -> mailbox index
+SQUARE_64 = [-1] * 120 #mailbox index -> 8x8 index, -1 off the board
+ROW_COL = [None] * 120 #mailbox index -> (row, col)
+for sq in range(64):
+    SQUARE_64[SQUARE_120[sq]] = sq
+    ROW_COL[SQUARE_120[sq]] = (sq // 8, sq % 8)
+SQUARE_BIT = [1 << SQUARE_64[sq] if SQUARE_64[sq] >= 0 else 0 for sq in range(120)] #mailbox index -> bitboard bit
+ALL_SQUARES = (1 << 64) - 1 #bitboard of the whole board
+
+#The move generator and the search pass moves around as packed ints, a Move object is only built for the GUI and
+#for printing (see Move). Bits 0-6 hold the start square, 7-9 the promotion piece type (EMPTY for no promotion),
+#10-16 the end square, 17-21 the piece moved and 22-26 the piece captured (the pawn for en passant), then one flag
+#bit for en passant and one for castling. The squares are mailbox indexes.
+#The low 17 bits (start, promotion, end) are the move id, which tells apart the moves of a position.
+SQUARE_MASK = 127
+PIECE_MASK = 31
+PROMOTION_SHIFT = 7
+END_SHIFT = 10
+MOVED_SHIFT = 17
+CAPTURED_SHIFT = 22
+EN_PASSANT_FLAG = 1 << 27
+CASTLE_FLAG = 1 << 28
+MOVE_ID_MASK = (1 << MOVED_SHIFT) - 1
+PROMOTION_MASK = TYPE_MASK << PROMOTION_SHIFT
+CAPTURED_MASK = PIECE_MASK << CAPTURED_SHIFT
+PIECE_TO_MASK = (1 << (CAPTURED_SHIFT - END_SHIFT)) - 1 #move >> END_SHIFT & PIECE_TO_MASK packs piece moved and end square
+
+#mailbox offsets of the 8 directions, the orthogonal ones first
+UP, DOWN, LEFT, RIGHT = -10, 10, -1, 1
+ORTHOGONAL_DIRECTIONS = (UP, LEFT, DOWN, RIGHT)
+DIAGONAL_DIRECTIONS = (UP + LEFT, UP + RIGHT, DOWN + LEFT, DOWN + RIGHT)
+KNIGHT_OFFSETS = (-21, -19, -12, -8, 8, 12, 19, 21)
+KING_OFFSETS = ORTHOGONAL_DIRECTIONS + DIAGONAL_DIRECTIONS
+
+#Attack tables built once at import, indexed by mailbox square (None off the board), so the move generators
+#never have to look at OFFBOARD squares:
+#KNIGHT_TARGETS / KING_TARGETS hold the squares a knight / king on that square can jump to.
+#ORTHOGONAL_RAYS / DIAGONAL_RAYS hold (direction, squares walked in that direction up to the edge) for the
+#4 rook / bishop directions, in the order of ORTHOGONAL_DIRECTIONS / DIAGONAL_DIRECTIONS. RAYS holds all 8.
+KNIGHT_TARGETS = [None] * 120
+KING_TARGETS = [None] * 120
+ORTHOGONAL_RAYS = [None] * 120
+DIAGONAL_RAYS = [None] * 120
+RAYS = [None] * 120
+for sq in SQUARE_120:
+    KNIGHT_TARGETS[sq] = tuple(sq + m for m in KNIGHT_OFFSETS if SQUARE_64[sq + m] >= 0)
+    KING_TARGETS[sq] = tuple(sq + m for m in KING_OFFSETS if SQUARE_64[sq + m] >= 0)
+    rays = []
+    for d in KING_OFFSETS:
+        ray = []
+        endSq = sq + d
+        while SQUARE_64[endSq] >= 0:
+            ray.append(endSq)
+            endSq += d
+        rays.append((d, tuple(ray)))
+    ORTHOGONAL_RAYS[sq] = tuple(rays[:4])
+    DIAGONAL_RAYS[sq] = tuple(rays[4:])
+    RAYS[sq] = tuple(rays)
+
+
+def square_index(row, col):
+    return 21 + row * 10 + col
+
+"""
+Packs a move into an int, the move generator does the same inline
+"""
+def encode_move(startSq, endSq, pieceMoved, pieceCaptured=EMPTY, promotionType=EMPTY, enPassant=False, castle=False):
+    return startSq | promotionType << PROMOTION_SHIFT | endSq << END_SHIFT | pieceMoved << MOVED_SHIFT | \
+           pieceCaptured << CAPTURED_SHIFT | (EN_PASSANT_FLAG if enPassant else 0) | (CASTLE_FLAG if castle else 0)
+
+#Zobrist keys: one random 64-bit number for every piece on every square, one for black to move,
+#one for each castling right and one for each en passant file. The position key is the XOR of the keys
+#of everything that is true in the position, so make_move only has to XOR in and out what changed.
+zobristRandom = random.Random(2117) #fixed seed so keys are the same in every process
+zobristPieces = {piece: [zobristRandom.getrandbits(64) if SQUARE_64[sq] >= 0 else 0 for sq in range(120)]
+                 for piece in PIECES}
+zobristPieces[EMPTY] = [0] * 120
+zobristBlackToMove = zobristRandom.getrandbits(64)
+zobristCastling = {right: zobristRandom.getrandbits(64) for right in ('wks', 'bks', 'wqs', 'bqs')}
+zobristEnpassant = [zobristRandom.getrandbits(64) for c in range(8)]
+
+#Piece-square scores of the tapered evaluation, material included, indexed [piece code][mailbox square] and
+#positive for white, negative for black. GameState keeps their sums over the board up to date in make_move,
+#so the evaluation never has to look at the board.
+midgameScores = {EMPTY: [0] * 120}
+endgameScores = {EMPTY: [0] * 120}
+phaseWeights = {EMPTY: 0}
+for piece in PIECES:
+    typeName = pieceNames[piece][1]
+    sign = 1 if piece & WHITE else -1
+    midgameScores[piece] = [0] * 120
+    endgameScores[piece] = [0] * 120
+    for sq in SQUARE_120:
+        r, c = ROW_COL[sq]
+        tableRow = r if piece & WHITE else 7 - r #black reads the table upside down
+        midgameScores[piece][sq] = sign * (PieceSquareTables.midgameMaterial[typeName] + PieceSquareTables.midgameTables[typeName][tableRow][c])
+        endgameScores[piece][sq] = sign * (PieceSquareTables.endgameMaterial[typeName] + PieceSquareTables.endgameTables[typeName][tableRow][c])
+    phaseWeights[piece] = PieceSquareTables.phaseWeights[typeName]
 
-#Board is an 8x8 2d array, each element of the array has 2 characters.
+#The position is kept in two forms that make_move and undo_move update together:
+#squares is the 10x12 mailbox of piece codes, used for move generation.
+#bitboards has a 64-bit integer per piece code with bit (row * 8 + col) set for every square that holds that
+#piece, used to find the pieces of one kind without scanning the board.
+#board is an 8x8 2d array view of squares for the GUI, each element of the array has 2 characters.
 #The firts character represents the clor of the piece, 'b' or 'w'.
 #The second character represents the type of the piece, 'K', 'Q', 'R', 'B', 'N' or 'p'.
 #The "--" represents an empty space with no piece.
@@ -19,15 +152,15 @@ class GameState():
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"]]
 
-        self.move_functions = {'p': self.get_pawn_moves, 'R': self.get_rook_moves, 'N': self.get_knight_moves,
-                               'B': self.get_bishop_moves, 'Q': self.get_queen_moves, 'K': self.get_king_moves}
+        self.move_functions = {PAWN: self.get_pawn_moves, ROOK: self.get_rook_moves, KNIGHT: self.get_knight_moves,
+                               BISHOP: self.get_bishop_moves, QUEEN: self.get_queen_moves, KING: self.get_king_moves}
         self.moveLog = []
         self.whiteToMove = True
-        self.whiteKingLocation = (7, 4)
-        self.blackKingLocation = (0, 4)
         self.inCheck = False
         self.pins = []  #pieces who blocks the king from checks
         self.checks = []
+        self.pinMasks = {} #square of a pinned piece -> bitboard of the squares it can move to
+        self.checkMask = ALL_SQUARES #bitboard of the squares that get out of check, set by get_legal_moves
         self.checkMate = False
         self.staleMate = False
         self.enpassantPossible = () #coordinates for the square where on passant capture is possible
@@ -35,70 +168,217 @@ class GameState():
         #castling rights
         self.currentCastlingRights = CastleRights(True, True, True, True)
         self.castleRightsLog = [CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks, self.currentCastlingRights.wqs, self.currentCastlingRights.bqs)]
+        #move counters: plies since the last capture or pawn move (fifty move rule) and the FEN move number
+        self.halfmoveClock = 0
+        self.halfmoveClockLog = [self.halfmoveClock]
+        self.fullmoveNumber = 1
+        #zobrist key of the position, updated incrementally by make_move and restored by undo_move
+        self.zobristKey = self.compute_zobrist_key()
+        self.zobristKeyLog = [self.zobristKey]
+        #piece-square sums of the evaluation, updated incrementally by make_move and restored by undo_move
+        self.midgameScore, self.endgameScore, self.gamePhase = self.compute_piece_square_scores()
+        self.pieceSquareScoreLog = [(self.midgameScore, self.endgameScore, self.gamePhase)]
+
+    '''
+    8x8 view of the board with the 2 character piece names, built from squares on every access
+    '''
+    @property
+    def board(self):
+        return [[pieceNames[self.squares[21 + r * 10 + c]] for c in range(8)] for r in range(8)]
+
+    '''
+    Sets up squares, bitboards and the king locations from an 8x8 board of piece names
+    '''
+    @board.setter
+    def board(self, board):
+        self.load_squares([pieceCodes[board[r][c]] for r in range(8) for c in range(8)])
+
+    '''
+    Sets up squares, bitboards and the king locations from the 64 piece codes of the board, a8 first
+    '''
+    def load_squares(self, pieces):
+        self.squares = [OFFBOARD] * 120
+        self.bitboards = [0] * ((BLACK | KING) + 1)
+        self.whiteKingSquare = self.blackKingSquare = None
+        for sq, piece in zip(SQUARE_120, pieces):
+            self.squares[sq] = piece
+            self.bitboards[piece] |= SQUARE_BIT[sq]
+            if piece == WHITE | KING:
+                self.whiteKingSquare = sq
+            elif piece == BLACK | KING:
+                self.blackKingSquare = sq
+        self.bitboards[EMPTY] = 0
 
+    '''
+    Sets the side to move, castling rights, en passant square and move counters of the position on the board and
+    starts a new game from it: the move log and the undo logs are cleared and the zobrist key is recomputed
+    '''
+    def set_state(self, whiteToMove, castleRights, enpassantPossible, halfmoveClock, fullmoveNumber):
+        self.moveLog = []
+        self.whiteToMove = whiteToMove
+        self.checkMate = False
+        self.staleMate = False
+        self.currentCastlingRights = castleRights
+        self.castleRightsLog = [CastleRights(castleRights.wks, castleRights.bks, castleRights.wqs, castleRights.bqs)]
+        self.enpassantPossible = enpassantPossible
+        self.enPassantPossibleLog = [enpassantPossible]
+        self.halfmoveClock = halfmoveClock
+        self.halfmoveClockLog = [halfmoveClock]
+        self.fullmoveNumber = fullmoveNumber
+        self.zobristKey = self.compute_zobrist_key()
+        self.zobristKeyLog = [self.zobristKey]
+        self.midgameScore, self.endgameScore, self.gamePhase = self.compute_piece_square_scores()
+        self.pieceSquareScoreLog = [(self.midgameScore, self.endgameScore, self.gamePhase)]
+
+    @property
+    def whiteKingLocation(self):
+        return ROW_COL[self.whiteKingSquare]
+
+    @property
+    def blackKingLocation(self):
+        return ROW_COL[self.blackKingSquare]
 
     """
-    Takes a move as a parameter and executes it (this will now work for castling, pawn promotion and en-pessant)
+    Takes a move as a parameter and executes it (this will now work for castling, pawn promotion and en-pessant).
+    The move is a packed int as the move generator returns them, or a Move.
     """
     def make_move(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
+        if type(move) is Move:
+            move = move.code
+        squares = self.squares
+        bitboards = self.bitboards
+        startSq = move & SQUARE_MASK
+        endSq = move >> END_SHIFT & SQUARE_MASK
+        pieceMoved = move >> MOVED_SHIFT & PIECE_MASK
+        pieceCaptured = move >> CAPTURED_SHIFT & PIECE_MASK
+        promotionType = move >> PROMOTION_SHIFT & TYPE_MASK
+        placedPiece = (pieceMoved & (WHITE | BLACK)) | promotionType if promotionType else pieceMoved #pawn promotion
+        key = self.zobristKey ^ zobristBlackToMove ^ zobristPieces[pieceMoved][startSq] ^ zobristPieces[placedPiece][endSq]
+        midgameScore = self.midgameScore - midgameScores[pieceMoved][startSq] + midgameScores[placedPiece][endSq]
+        endgameScore = self.endgameScore - endgameScores[pieceMoved][startSq] + endgameScores[placedPiece][endSq]
+        gamePhase = self.gamePhase - phaseWeights[pieceMoved] + phaseWeights[placedPiece]
+        if self.enpassantPossible != ():
+            key ^= zobristEnpassant[self.enpassantPossible[1]]
+        squares[startSq] = EMPTY
+        squares[endSq] = placedPiece
+        bitboards[pieceMoved] ^= SQUARE_BIT[startSq]
+        bitboards[placedPiece] ^= SQUARE_BIT[endSq]
+        if pieceCaptured != EMPTY:
+            #if enpassant move , must update the board to capture the pawn
+            capturedSq = startSq - startSq % 10 + endSq % 10 if move & EN_PASSANT_FLAG else endSq
+            if move & EN_PASSANT_FLAG:
+                squares[capturedSq] = EMPTY #capturing the pawn
+            bitboards[pieceCaptured] ^= SQUARE_BIT[capturedSq]
+            key ^= zobristPieces[pieceCaptured][capturedSq]
+            midgameScore -= midgameScores[pieceCaptured][capturedSq]
+            endgameScore -= endgameScores[pieceCaptured][capturedSq]
+            gamePhase -= phaseWeights[pieceCaptured]
         self.moveLog.append(move) #Log the move so we can undo it later
         self.whiteToMove = not self.whiteToMove #swap players
         #update the king's position
-        if move.pieceMoved == "wK":
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == "bK":
-            self.blackKingLocation = (move.endRow, move.endCol)
+        if pieceMoved == WHITE | KING:
+            self.whiteKingSquare = endSq
+        elif pieceMoved == BLACK | KING:
+            self.blackKingSquare = endSq
         #if pawn move twice , next move can capture enpassant
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2:
-            self.enpassantPossible = ((move.endRow + move.startRow)//2, move.endCol)
+        if pieceMoved & TYPE_MASK == PAWN and abs(startSq - endSq) == 20:
+            self.enpassantPossible = ROW_COL[(startSq + endSq) // 2] #the square the pawn skipped
         else:
             self.enpassantPossible = ()
-        #if enpassant move , must update the board to capture the pawn
-        if move.enPassant:
-            self.board[move.startRow][move.endCol] = "--" #capturing the pawn
-        #pawn promotion
-        """ if move.isPawnPromotion:
-            #promotedPiece = input("Promote to Q, R, B or N:")
-            promotedPiece = 'Q'
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + promotedPiece """
-        
         #castle moves
-        if move.castle:
-            if move.endCol - move.startCol == 2: #king side
-                self.board[move.endRow][move.endCol-1] = self.board[move.endRow][move.endCol+1] #move rook
-                self.board[move.endRow][move.endCol+1] = '--' #empty space where rook was
+        if move & CASTLE_FLAG:
+            if endSq - startSq == 2: #king side
+                rookStart, rookEnd = endSq + 1, endSq - 1
             else: #queen side
-                self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-2] #move rook
-                self.board[move.endRow][move.endCol-2] = '--' #empty space where rook was
+                rookStart, rookEnd = endSq - 2, endSq + 1
+            rook = squares[rookStart]
+            squares[rookEnd] = rook #move rook
+            squares[rookStart] = EMPTY #empty space where rook was
+            bitboards[rook] ^= SQUARE_BIT[rookStart] | SQUARE_BIT[rookEnd]
+            key ^= zobristPieces[rook][rookStart] ^ zobristPieces[rook][rookEnd]
+            midgameScore += midgameScores[rook][rookEnd] - midgameScores[rook][rookStart]
+            endgameScore += endgameScores[rook][rookEnd] - endgameScores[rook][rookStart]
 
         self.enPassantPossibleLog.append(self.enpassantPossible)
+        if self.enpassantPossible != ():
+            key ^= zobristEnpassant[self.enpassantPossible[1]]
         #update castling rights
-        self.update_castle_rights(move)
+        key ^= self.castle_rights_key(self.currentCastlingRights)
+        self.update_castle_rights(startSq, endSq, pieceMoved, pieceCaptured)
+        key ^= self.castle_rights_key(self.currentCastlingRights)
         self.castleRightsLog.append(CastleRights(self.currentCastlingRights.wks, self.currentCastlingRights.bks, self.currentCastlingRights.wqs, self.currentCastlingRights.bqs))
+        bitboards[EMPTY] = 0
+        self.zobristKey = key
+        self.zobristKeyLog.append(key)
+        self.midgameScore = midgameScore
+        self.endgameScore = endgameScore
+        self.gamePhase = gamePhase
+        self.pieceSquareScoreLog.append((midgameScore, endgameScore, gamePhase))
+        #move counters
+        if pieceMoved & TYPE_MASK == PAWN or pieceCaptured != EMPTY:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        self.halfmoveClockLog.append(self.halfmoveClock)
+        if self.whiteToMove: #black just moved
+            self.fullmoveNumber += 1
+
+    '''
+    Passes the turn without moving, for the null move pruning of the search. The move log gets None for it,
+    undo_move takes it back like a move.
+    '''
+    def make_null_move(self):
+        key = self.zobristKey ^ zobristBlackToMove
+        if self.enpassantPossible != ():
+            key ^= zobristEnpassant[self.enpassantPossible[1]]
+        self.enpassantPossible = ()
+        self.enPassantPossibleLog.append(self.enpassantPossible)
+        self.moveLog.append(None)
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey = key
+        self.zobristKeyLog.append(key)
 
     '''
     Undo the las move made
-    '''  
+    '''
     def undo_move(self):
-        if len(self.moveLog) != 0: #make sure that there is a move to undo
+        if len(self.moveLog) != 0 and self.moveLog[-1] is None: #a null move
+            self.moveLog.pop()
+            self.whiteToMove = not self.whiteToMove
+            self.enPassantPossibleLog.pop()
+            self.enpassantPossible = self.enPassantPossibleLog[-1]
+            self.zobristKeyLog.pop()
+            self.zobristKey = self.zobristKeyLog[-1]
+        elif len(self.moveLog) != 0: #make sure that there is a move to undo
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            squares = self.squares
+            bitboards = self.bitboards
+            startSq = move & SQUARE_MASK
+            endSq = move >> END_SHIFT & SQUARE_MASK
+            pieceMoved = move >> MOVED_SHIFT & PIECE_MASK
+            pieceCaptured = move >> CAPTURED_SHIFT & PIECE_MASK
+            promotionType = move >> PROMOTION_SHIFT & TYPE_MASK
+            squares[startSq] = pieceMoved
+            squares[endSq] = pieceCaptured
+            bitboards[pieceMoved] ^= SQUARE_BIT[startSq]
+            bitboards[(pieceMoved & (WHITE | BLACK)) | promotionType if promotionType else pieceMoved] ^= SQUARE_BIT[endSq]
             self.whiteToMove = not self.whiteToMove #switch turns back
 
             #update the king's position
-            if move.pieceMoved == "wK":
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == "bK":
-                self.blackKingLocation = (move.startRow, move.startCol)
+            if pieceMoved == WHITE | KING:
+                self.whiteKingSquare = startSq
+            elif pieceMoved == BLACK | KING:
+                self.blackKingSquare = startSq
 
             #undo enpassant
-            if move.enPassant:
-                self.board[move.endRow][move.endCol] = '--' #removes the pawn that was added in the wrong square
-                self.board[move.startRow][move.endCol] = move.pieceCaptured #puts the pawn back on the correct square it was captured from
-           
+            if move & EN_PASSANT_FLAG:
+                capturedSq = startSq - startSq % 10 + endSq % 10
+                squares[endSq] = EMPTY #removes the pawn that was added in the wrong square
+                squares[capturedSq] = pieceCaptured #puts the pawn back on the correct square it was captured from
+                bitboards[pieceCaptured] ^= SQUARE_BIT[capturedSq]
+            elif pieceCaptured != EMPTY:
+                bitboards[pieceCaptured] ^= SQUARE_BIT[endSq]
+
             self.enPassantPossibleLog.pop()
             self.enpassantPossible = self.enPassantPossibleLog[-1]
 
@@ -110,58 +390,38 @@ class GameState():
             self.currentCastlingRights.wqs = castleRights.wqs
             self.currentCastlingRights.bqs = castleRights.bqs
 
+            #restore the position key from before the move
+            self.zobristKeyLog.pop()
+            self.zobristKey = self.zobristKeyLog[-1]
+            self.pieceSquareScoreLog.pop()
+            self.midgameScore, self.endgameScore, self.gamePhase = self.pieceSquareScoreLog[-1]
+
+            #restore the move counters
+            self.halfmoveClockLog.pop()
+            self.halfmoveClock = self.halfmoveClockLog[-1]
+            if not self.whiteToMove: #undoing a black move
+                self.fullmoveNumber -= 1
+
             #undo castle
-            if move.castle:
-                if move.endCol - move.startCol == 2: #king side
-                    self.board[move.endRow][move.endCol+1] = self.board[move.endRow][move.endCol-1] #move rook
-                    self.board[move.endRow][move.endCol-1] = '--' #empty space where rook was
+            if move & CASTLE_FLAG:
+                if endSq - startSq == 2: #king side
+                    rookStart, rookEnd = endSq + 1, endSq - 1
                 else: #queen side
-                    self.board[move.endRow][move.endCol-2] = self.board[move.endRow][move.endCol+1] #move rook
-                    self.board[move.endRow][move.endCol+1] = '--' #empty space where rook was
+                    rookStart, rookEnd = endSq - 2, endSq + 1
+                rook = squares[rookEnd]
+                squares[rookStart] = rook #move rook
+                squares[rookEnd] = EMPTY #empty space where rook was
+                bitboards[rook] ^= SQUARE_BIT[rookStart] | SQUARE_BIT[rookEnd]
+            bitboards[EMPTY] = 0
 
             self.checkMate = False
-            self.staleMates = False 
+            self.staleMate = False
 
     '''
-    All moves considering checks
+    All moves considering checks, as packed ints
     '''
     def get_valid_moves(self):
-        moves = []
-        self.inCheck, self.pins, self.checks = self.check_for_pins_and_checks()
-        if self.whiteToMove:
-            kingRow = self.whiteKingLocation[0]
-            kingCol = self.whiteKingLocation[1]
-        else:
-            kingRow = self.blackKingLocation[0]
-            kingCol = self.blackKingLocation[1]
-        if self.inCheck:
-            if len(self.checks) == 1: #only 1 check, block check or move king 
-                moves = self.get_all_possible_moves()
-                #to block a check you must move a piece into one of the squares between the enemy and piece and king 
-                check = self.checks[0] #check information
-                checkRow = check[0]
-                checkCol = check[1]
-                pieceChecking = self.board[checkRow][checkCol] #enemy piece causing the check
-                validSquares = [] #squares that pieces can move to
-                #if knight, must capture knight or move king, other pieces can be blocked
-                if pieceChecking[1] == 'N':
-                    validSquares = [(checkRow, checkCol)]
-                else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i) #check[2] and check[3] are the check directions
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol: #once you get to piece and checks
-                            break
-                #get rind of any moves that don't block check or move king
-                for i in range(len(moves)-1, -1, -1): #go through backwards when you are removing from a list as iterating 
-                    if moves[i].pieceMoved[1] != 'K': #move doesn't move king so it must block or capture
-                        if not (moves[i].endRow, moves[i].endCol) in validSquares: #move doesn't block check or capture piece
-                            moves.remove(moves[i])
-            else: #double check, king has to move
-                self.get_king_moves(kingRow, kingCol, moves)
-        else: #not in check so all moves are fine
-            moves = self.get_all_possible_moves()
-        
+        moves = self.get_legal_moves()
         if len(moves) == 0:
             if self.inCheck:
                 self.checkMate = True
@@ -172,379 +432,649 @@ class GameState():
             self.staleMate = False
         return moves
 
+    '''
+    The valid moves as Move objects, for the GUI and for printing
+    '''
+    def get_valid_move_objects(self):
+        return [Move.from_code(move) for move in self.get_valid_moves()]
+
+    '''
+    Captures and pawn moves to the last rank considering checks, for the quiescence search. When in check all
+    the moves that get out of check are returned, checkMate is set if there are none. staleMate is never set
+    since quiet moves are not generated.
+    '''
+    def get_capture_moves(self):
+        moves = self.get_legal_moves(capturesOnly=True)
+        self.checkMate = self.inCheck and len(moves) == 0
+        self.staleMate = False
+        return moves
 
     '''
-    All moves without considering checks
+    All moves considering checks, only captures and pawn moves to the last rank if capturesOnly is True and
+    the king is not in check. The check and pins are turned into bitboard masks of the squares pieces may move to
+    first, so the piece move functions only generate legal moves.
     '''
-    def get_all_possible_moves(self):
+    def get_legal_moves(self, capturesOnly=False):
         moves = []
-        for r in range(len(self.board)): #number of rows
-            for c in range(len(self.board[r])): #number of cols in given row
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    self.move_functions[piece](r, c, moves) #call the apropiate move function based on piece type
+        self.inCheck, self.pins, self.checks = self.check_for_pins_and_checks()
+        kingSq = self.whiteKingSquare if self.whiteToMove else self.blackKingSquare
+        squares = self.squares
+        #a pinned piece can only move on the line from the king through it up to the pinning piece
+        self.pinMasks = {}
+        for pinSq, pinDirection in self.pins:
+            pinMask = 0
+            endSq = kingSq + pinDirection
+            while True:
+                pinMask |= SQUARE_BIT[endSq]
+                if endSq != pinSq and squares[endSq] != EMPTY: #the pinning piece
+                    break
+                endSq += pinDirection
+            self.pinMasks[pinSq] = pinMask
+        if self.inCheck:
+            if len(self.checks) == 1: #only 1 check, block check or move king
+                #pieces other than the king must capture the checking piece or move between it and the king,
+                #for a knight kingSq + checkDirection is the knight itself
+                checkSq, checkDirection = self.checks[0]
+                self.checkMask = 0
+                blockSq = kingSq
+                while blockSq != checkSq:
+                    blockSq += checkDirection
+                    self.checkMask |= SQUARE_BIT[blockSq]
+                moves = self.get_all_possible_moves() #every move out of check, also when capturesOnly
+            else: #double check, king has to move
+                self.get_king_moves(kingSq, moves)
+        else: #not in check so any square the pins allow is fine
+            self.checkMask = ALL_SQUARES
+            moves = self.get_all_possible_moves(capturesOnly)
         return moves
 
-    '''         
-    Get all the pawn moves for the pawn located at row, col and add these moves to the list
-    '''             
-    def get_pawn_moves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+
+    '''
+    All moves within checkMask and pinMasks as set up by get_legal_moves
+    '''
+    def get_all_possible_moves(self, capturesOnly=False):
+        moves = []
+        color = WHITE if self.whiteToMove else BLACK
+        for pieceType in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING):
+            moveFunction = self.move_functions[pieceType]
+            pieces = self.bitboards[color | pieceType]
+            while pieces: #visit the set bits from the lowest one up
+                lowestBit = pieces & -pieces
+                pieces ^= lowestBit
+                moveFunction(SQUARE_120[lowestBit.bit_length() - 1], moves, capturesOnly) #call the apropiate move function based on piece type
+        return moves
+
+    '''
+    Get all the pawn moves for the pawn located at sq and add these moves to the list
+    '''
+    def get_pawn_moves(self, sq, moves, capturesOnly=False):
+        pinMask = self.pinMasks.get(sq, ALL_SQUARES)
+        targetMask = self.checkMask & pinMask
+        squares = self.squares
         if self.whiteToMove: #white pawn moves
-            moveAmount = -1
+            moveAmount = UP
             startRow = 6
-            enemyColor = 'b'
-            kingRow, kingCol = self.whiteKingLocation
+            enemyColor = BLACK
+            kingSq = self.whiteKingSquare
         else:
-            moveAmount = 1
+            moveAmount = DOWN
             startRow = 1
-            enemyColor = 'w'
-            kingRow, kingCol = self.blackKingLocation
-            
-        if self.board[r + moveAmount][c] == "--": #1 square pawn advance
-                if not piecePinned or pinDirection == (moveAmount, 0):
-                    moves.append(Move((r, c), (r + moveAmount, c), self.board))
-                    if r == startRow and self.board[r + 2 * moveAmount][c] == "--": #2 square pawn advance
-                        moves.append(Move((r, c), (r + 2 * moveAmount, c), self.board))
-
-        if c - 1 >= 0: #captures to the left
-            if not piecePinned or pinDirection == (moveAmount, -1):
-                if self.board[r + moveAmount][c - 1][0] == enemyColor:
-                    moves.append(Move((r, c), (r + moveAmount, c - 1), self.board))
-                if (r + moveAmount, c - 1) == self.enpassantPossible:
-                    attackingPiece = blockingPiece = False
-                    if kingRow == r:
-                        if kingCol < c: #king is left to the pawn
-                            #inside between king and pawn; outside range between pawn border
-                            insideRange = range(kingCol + 1, c - 1)
-                            outsideRange = range(c + 1, 8)
-                        else:
-                            insideRange = range(kingCol - 1, c, -1)
-                            outsideRange = range(c - 2, -1, -1)
-                        for i in insideRange:
-                            if self.board[r][i] != "--": #some other piece beside en-passant pawn blocks
-                                blockingPiece = True
-                        for i in outsideRange:
-                            square = self.board[r][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"): #attacking piece
-                                attackingPiece = True
-                            elif square != "--":
-                                blockingPiece = True
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((r, c), (r + moveAmount, c - 1), self.board, enPassant=True))
-        if c+1 <= 7: #captures to the right
-            if not piecePinned or pinDirection == (moveAmount, 1):
-                if self.board[r + moveAmount][c + 1][0] == enemyColor:
-                    moves.append(Move((r, c), (r + moveAmount, c + 1), self.board))
-                if (r + moveAmount, c + 1) == self.enpassantPossible:
-                    attackingPiece = blockingPiece = False
-                    if kingRow == r:
-                        if kingCol < c: #king is left to the pawn
-                            #inside between king and pawn; outside range between pawn border
-                            insideRange = range(kingCol + 1, c)
-                            outsideRange = range(c + 2, 8)
-                        else:
-                            insideRange = range(kingCol - 1, c + 1, -1)
-                            outsideRange = range(c - 1, -1, -1)
-                        for i in insideRange:
-                            if self.board[r][i] != "--": #some other piece beside en-passant pawn blocks
-                                blockingPiece = True
-                        for i in outsideRange:
-                            square = self.board[r][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"): #attacking piece
-                                attackingPiece = True
-                            elif square != "--":
-                                blockingPiece = True
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((r, c), (r + moveAmount, c + 1), self.board, enPassant=True))
-
-    '''
-     Get all the rook moves for the rook located at row, col and add these moves to the list
-    '''             
-    def get_rook_moves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != 'Q': #can't move queen from pin on rook moves, only remove it on bishop moves
-                    self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1)) # up, left, down, right
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":    # empty space valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:     # enemy piece valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # friendly piece invalid
-                            break
-                else:   # off board
-                    break
-        
-    '''
-     Get all the bishop moves for the bishop located at row, col and add these moves to the list
-    '''  
-    def get_bishop_moves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1)) 
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):   # max of 7 squares
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--":    # empty space valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:     # enemy piece valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else:  # friendly piece invalid
-                            break
-                else:   # off board
-                    break
+            enemyColor = WHITE
+            kingSq = self.blackKingSquare
+        pawnMove = sq | squares[sq] << MOVED_SHIFT #the bits all the moves of the pawn share
+        oneStep = sq + moveAmount
+
+        promotion = squares[oneStep + moveAmount] == OFFBOARD #the pawn reaches the last rank
+        if squares[oneStep] == EMPTY and (not capturesOnly or promotion): #1 square pawn advance
+            if SQUARE_BIT[oneStep] & targetMask:
+                self.add_pawn_move(pawnMove, oneStep, promotion, moves)
+            twoSteps = oneStep + moveAmount
+            #2 square pawn advance, it can block a check the 1 square advance doesn't
+            if ROW_COL[sq][0] == startRow and squares[twoSteps] == EMPTY and SQUARE_BIT[twoSteps] & targetMask:
+                moves.append(pawnMove | twoSteps << END_SHIFT)
+
+        for side in (LEFT, RIGHT): #captures to the left and to the right
+            endSq = oneStep + side
+            if squares[endSq] & enemyColor and SQUARE_BIT[endSq] & targetMask:
+                self.add_pawn_move(pawnMove, endSq, promotion, moves)
+            #an en passant capture can also get out of check by taking the checking pawn beside it
+            if ROW_COL[endSq] == self.enpassantPossible and SQUARE_BIT[endSq] & pinMask and \
+               (SQUARE_BIT[endSq] | SQUARE_BIT[sq + side]) & self.checkMask:
+                if not self.enpassant_exposes_king(sq, sq + side, kingSq, enemyColor):
+                    moves.append(pawnMove | endSq << END_SHIFT | (enemyColor | PAWN) << CAPTURED_SHIFT | EN_PASSANT_FLAG)
+
+    '''
+    Adds the pawn move to endSq, or one move for every piece the pawn can promote to when it reaches the last rank.
+    pawnMove has the start square and the pawn packed in already.
+    '''
+    def add_pawn_move(self, pawnMove, endSq, promotion, moves):
+        move = pawnMove | endSq << END_SHIFT | self.squares[endSq] << CAPTURED_SHIFT
+        if promotion:
+            for promotionType in (QUEEN, KNIGHT, ROOK, BISHOP):
+                moves.append(move | promotionType << PROMOTION_SHIFT)
+        else:
+            moves.append(move)
+
+    '''
+    True if taking en passant with the pawn on sq, which removes the enemy pawn on capturedSq,
+    leaves the king on kingSq attacked along the row by a rook or queen
+    '''
+    def enpassant_exposes_king(self, sq, capturedSq, kingSq, enemyColor):
+        attackingPiece = blockingPiece = False
+        if kingSq // 10 == sq // 10: #king on the same row as the pawns
+            side = RIGHT if kingSq < sq else LEFT #direction from the king towards the pawns
+            #inside between king and pawns; outside between pawns and border
+            insideSq = kingSq + side
+            while insideSq != sq and insideSq != capturedSq:
+                if self.squares[insideSq] != EMPTY: #some other piece beside en-passant pawn blocks
+                    blockingPiece = True
+                insideSq += side
+            outsideSq = max(sq, capturedSq) + 1 if side == RIGHT else min(sq, capturedSq) - 1
+            while self.squares[outsideSq] == EMPTY:
+                outsideSq += side
+            square = self.squares[outsideSq] #first piece past the pawns, only it can attack the king
+            if square & enemyColor and (square & TYPE_MASK == ROOK or square & TYPE_MASK == QUEEN): #attacking piece
+                attackingPiece = True
+        return attackingPiece and not blockingPiece
+
+    '''
+     Get all the rook moves for the rook located at sq and add these moves to the list
+    '''
+    def get_rook_moves(self, sq, moves, capturesOnly=False):
+        self.get_sliding_moves(sq, moves, capturesOnly, ORTHOGONAL_RAYS[sq])
+
+    '''
+     Get all the bishop moves for the bishop located at sq and add these moves to the list
+    '''
+    def get_bishop_moves(self, sq, moves, capturesOnly=False):
+        self.get_sliding_moves(sq, moves, capturesOnly, DIAGONAL_RAYS[sq])
 
     '''
-     Get all the knight moves for the knight located at row, col and add these moves to the list
-    '''      
-    def get_knight_moves(self, r, c, moves):
-        piecePinned = False        
-        for i in range(len(self.pins)-1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                self.pins.remove(self.pins[i])
-                break
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        allyColor = "w" if self.whiteToMove else "b"
-        for m in knightMoves:
-            endRow = r + m[0] 
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor:     # not an ally piece (empty or enemy piece)
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-
-    '''
-     Get all the queen moves for the queen located at row, col and add these moves to the list
-    '''  
-    def get_queen_moves(self, r, c, moves):
-        self.get_rook_moves(r,c, moves)
-        self.get_bishop_moves(r,c, moves)
-
-    '''
-     Get all the king moves for the king located at row, col and add these moves to the list
-    '''  
-    def get_king_moves(self, r, c, moves):
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        allyColor = "w" if self.whiteToMove else "b"
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor:   # not an ally piece (empty or enemy piece)
-                        #place king on end square and check for checks
-                        if allyColor == 'w':
-                            self.whiteKingLocation = (endRow, endCol)
-                        else:
-                            self.blackKingLocation = (endRow, endCol)
-                        inCheck, pins, checks = self.check_for_pins_and_checks()
-                        if not inCheck:
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        #place king back on original location
-                        if allyColor == 'w':
-                            self.whiteKingLocation = (r, c)
-                        else:
-                            self.blackKingLocation = (r, c)
-        self.get_castle_moves(r, c, moves, allyColor)
-    '''
-     Generates castle moves for the king at (r,c) and add them to the list of moves
-    '''  
-    def get_castle_moves(self, r, c, moves, allyColor):
-        inCheck = self.square_under_attack(r, c, allyColor)
+     Walks the rays from sq up to the edge of the board or the first piece and adds the moves to the list
+    '''
+    def get_sliding_moves(self, sq, moves, capturesOnly, rays):
+        squares = self.squares
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        pieceMove = sq | squares[sq] << MOVED_SHIFT
+        pinMask = self.pinMasks.get(sq, ALL_SQUARES)
+        targetMask = self.checkMask & pinMask
+        for d, ray in rays:
+            if ray and SQUARE_BIT[ray[0]] & pinMask: #a pinned piece can only move along the pin
+                for endSq in ray:
+                    endPiece = squares[endSq]
+                    if endPiece == EMPTY:    # empty space valid
+                        if not capturesOnly and SQUARE_BIT[endSq] & targetMask:
+                            moves.append(pieceMove | endSq << END_SHIFT)
+                    else:
+                        if endPiece & enemyColor and SQUARE_BIT[endSq] & targetMask:     # enemy piece valid
+                            moves.append(pieceMove | endSq << END_SHIFT | endPiece << CAPTURED_SHIFT)
+                        break #friendly piece invalid
+
+    '''
+     Get all the knight moves for the knight located at sq and add these moves to the list
+    '''
+    def get_knight_moves(self, sq, moves, capturesOnly=False):
+        if sq in self.pinMasks:
+            return #a pinned knight can't move
+        squares = self.squares
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        pieceMove = sq | squares[sq] << MOVED_SHIFT
+        checkMask = self.checkMask
+        for endSq in KNIGHT_TARGETS[sq]:
+            endPiece = squares[endSq]
+            if (endPiece & enemyColor or (endPiece == EMPTY and not capturesOnly)) and SQUARE_BIT[endSq] & checkMask:     # not an ally piece (empty or enemy piece)
+                moves.append(pieceMove | endSq << END_SHIFT | endPiece << CAPTURED_SHIFT)
+
+    '''
+     Get all the queen moves for the queen located at sq and add these moves to the list
+    '''
+    def get_queen_moves(self, sq, moves, capturesOnly=False):
+        self.get_rook_moves(sq, moves, capturesOnly)
+        self.get_bishop_moves(sq, moves, capturesOnly)
+
+    '''
+     Get all the king moves for the king located at sq and add these moves to the list
+    '''
+    def get_king_moves(self, sq, moves, capturesOnly=False):
+        squares = self.squares
+        allyColor = WHITE if self.whiteToMove else BLACK
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        pieceMove = sq | squares[sq] << MOVED_SHIFT
+        for endSq in KING_TARGETS[sq]:
+            endPiece = squares[endSq]
+            if endPiece & enemyColor or (endPiece == EMPTY and not capturesOnly):   # not an ally piece (empty or enemy piece)
+                #place king on end square and check for checks
+                if allyColor == WHITE:
+                    self.whiteKingSquare = endSq
+                else:
+                    self.blackKingSquare = endSq
+                inCheck, pins, checks = self.check_for_pins_and_checks()
+                if not inCheck:
+                    moves.append(pieceMove | endSq << END_SHIFT | endPiece << CAPTURED_SHIFT)
+                #place king back on original location
+                if allyColor == WHITE:
+                    self.whiteKingSquare = sq
+                else:
+                    self.blackKingSquare = sq
+        if not capturesOnly:
+            self.get_castle_moves(sq, moves, allyColor)
+    '''
+     Generates castle moves for the king at sq and add them to the list of moves
+    '''
+    def get_castle_moves(self, sq, moves, allyColor):
+        inCheck = self.square_under_attack(sq, allyColor)
         if inCheck:
             return #can't castle in check
         if (self.whiteToMove and self.currentCastlingRights.wks) or (not self.whiteToMove and self.currentCastlingRights.bks): #can't castle if given up rights
-            self.get_king_side_castle_moves(r, c, moves, allyColor)
+            self.get_king_side_castle_moves(sq, moves, allyColor)
         if (self.whiteToMove and self.currentCastlingRights.wqs) or (not self.whiteToMove and self.currentCastlingRights.bqs): #can't castle if given up rights
-            self.get_queen_side_castle_moves(r, c, moves, allyColor)
-      
+            self.get_queen_side_castle_moves(sq, moves, allyColor)
+
+    '''
+    Generate kingside castle moves for the king at sq. This method will only be called if player still has castle rights kingside.
     '''
-    Generate kingside castle moves for the king at (r,c). This method will only be called if player still has castle rights kingside.
-    '''  
-    def get_king_side_castle_moves(self, r, c, moves, allyColor):
+    def get_king_side_castle_moves(self, sq, moves, allyColor):
         #check if two square between king and rook are clear and not under attack
-        if self.board[r][c+1] == '--' and self.board[r][c+2] == '--' and not self.square_under_attack(r, c+1, allyColor) and \
-        not self.square_under_attack(r, c+2, allyColor):
-            moves.append(Move((r, c), (r, c+2), self.board, castle = True))
+        if self.squares[sq+1] == EMPTY and self.squares[sq+2] == EMPTY and not self.square_under_attack(sq+1, allyColor) and \
+        not self.square_under_attack(sq+2, allyColor):
+            moves.append(sq | (sq+2) << END_SHIFT | self.squares[sq] << MOVED_SHIFT | CASTLE_FLAG)
 
     '''
-    Generate queenside castle moves for the king at (r,c). This method will only be called if player still has castle rights queenside.
-    '''  
-    def get_queen_side_castle_moves(self, r, c, moves, allyColor):
+    Generate queenside castle moves for the king at sq. This method will only be called if player still has castle rights queenside.
+    '''
+    def get_queen_side_castle_moves(self, sq, moves, allyColor):
         #check if two square between king and rook are clear and two squares left of king are not under attack
-        if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--' and \
-        not self.square_under_attack(r, c-1, allyColor) and not self.square_under_attack(r, c-2, allyColor):
-            moves.append(Move((r, c), (r, c-2), self.board, castle = True))
-    
+        if self.squares[sq-1] == EMPTY and self.squares[sq-2] == EMPTY and self.squares[sq-3] == EMPTY and \
+        not self.square_under_attack(sq-1, allyColor) and not self.square_under_attack(sq-2, allyColor):
+            moves.append(sq | (sq-2) << END_SHIFT | self.squares[sq] << MOVED_SHIFT | CASTLE_FLAG)
 
-    def square_under_attack(self, r, c, allyColor):
+
+    def square_under_attack(self, sq, allyColor):
         #check outward from square
-        enemyColor = "w" if allyColor == 'b' else "b"
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
-            for i in range(1, 8):
-                endRow = r + d[0] *i
-                endCol = c + d[1] *i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor: # not attack from that direction
-                        break
-                    elif endPiece[0] == enemyColor:
-                        types = endPiece[1]
-                        #5 posibilities here in this complex conditional
-                        #1.) orthogonally away from king and piece is a rook
-                        #2.) diagonally away from king and piece is a bishop
-                        #3.) 1 square away diagonally from king and piece is a pawn 
-                        #4.) any direction and piece is a queen
-                        #5.) any direction 1 square away and piece is a king (this is necessaty to prevent a king move to a square controlled by another king)
-                        if(0 <= j <= 3 and types == 'R') or \
-                        (4 <= j <= 7 and types == 'B') or \
-                        (i == 1 and types == 'p' and ((enemyColor == 'w' and  6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
-                        (types == 'Q') or (i == 1 and types == 'K'):
-                            return True
-                        else:  #enemy piece not applying check
-                            break
-                else:  #off board
+        squares = self.squares
+        enemyColor = WHITE if allyColor == BLACK else BLACK
+        for j, (d, ray) in enumerate(RAYS[sq]):
+            for endSq in ray:
+                if squares[endSq] != EMPTY:
                     break
-        #check for knight checks
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = r + m[0] 
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] ==  enemyColor and endPiece[1] == 'N': #enemy knight attacking king
+            else:
+                continue #nothing in this direction
+            endPiece = squares[endSq]
+            i = 1 if endSq == sq + d else 2 #only the first square matters for pawns and kings
+            if endPiece & enemyColor:
+                types = endPiece & TYPE_MASK
+                #5 posibilities here in this complex conditional
+                #1.) orthogonally away from king and piece is a rook
+                #2.) diagonally away from king and piece is a bishop
+                #3.) 1 square away diagonally from king and piece is a pawn
+                #4.) any direction and piece is a queen
+                #5.) any direction 1 square away and piece is a king (this is necessaty to prevent a king move to a square controlled by another king)
+                if(0 <= j <= 3 and types == ROOK) or \
+                (4 <= j <= 7 and types == BISHOP) or \
+                (i == 1 and types == PAWN and ((enemyColor == WHITE and 6 <= j <= 7) or (enemyColor == BLACK and 4 <= j <= 5))) or \
+                (types == QUEEN) or (i == 1 and types == KING):
                     return True
+            #ally piece or enemy piece not applying check: no attack from that direction
+        #check for knight checks
+        enemyKnight = enemyColor | KNIGHT
+        for endSq in KNIGHT_TARGETS[sq]:
+            if squares[endSq] == enemyKnight: #enemy knight attacking king
+                return True
         return False
 
-        
+
     '''
-    Returns if a player is in check, a list of pins, and a list of checks
+    Returns if a player is in check, a list of pins, and a list of checks.
+    Pins and checks are (square of the piece, direction from the king to it).
     '''
     def check_for_pins_and_checks(self):
+        squares = self.squares
         pins = [] # squares where the allied pinned piece is and direction pinned from
         checks = [] #squares where the enemy is applying a check
         inCheck = False
         if self.whiteToMove:
-            enemyColor = "b"
-            allyColor = "w"
-            startRow = self.whiteKingLocation[0]
-            startCol = self.whiteKingLocation[1]
+            enemyColor = BLACK
+            allyColor = WHITE
+            startSq = self.whiteKingSquare
         else:
-            enemyColor = "w"
-            allyColor = "b"
-            startRow = self.blackKingLocation[0]
-            startCol = self.blackKingLocation[1]
+            enemyColor = WHITE
+            allyColor = BLACK
+            startSq = self.blackKingSquare
         #check outward form king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
-            possiblePin = () #reset possible pin
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != 'K': # not an ally piece (empty or enemy piece)
-                        if possiblePin == (): #1st allied piece could pinned
-                            possiblePin = (endRow, endCol, d[0], d[1])
-                        else:   #2nd allied piece, so no pin or check is possible in this direction
-                            break
-                    elif endPiece[0] == enemyColor:
-                        types = endPiece[1]
-                        #5 posibilities here in this complex conditional
-                        #1.) orthogonally away from king and piece is a rook
-                        #2.) diagonally away from king and piece is a bishop
-                        #3.) 1 square away diagonally from king and piece is a pawn 
-                        #4.) any direction and piece is a queen
-                        #5.) any direction 1 square away and piece is a king (this is necessaty to prevent a king move to a square controlled by another king)
-                        if(0 <= j <= 3 and types == 'R') or \
-                        (4 <= j <= 7 and types == 'B') or \
-                        (i == 1 and types == 'p' and ((enemyColor == 'w' and  6 <= j <= 7) or (enemyColor == 'b' and 4 <= j <= 5))) or \
-                        (types == 'Q') or (i == 1 and types == 'K'):
-                            if possiblePin == (): #no piece blocking, so check
-                                inCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else: #piece is blocking so pin
-                                pins.append(possiblePin)
-                        else:  #enemy piece not applying check
-                            break
-                else:  #off board
-                    break
+        for j, (d, ray) in enumerate(RAYS[startSq]):
+            possiblePin = None #reset possible pin
+            for i, endSq in enumerate(ray, 1):
+                endPiece = squares[endSq]
+                if endPiece & allyColor and endPiece & TYPE_MASK != KING: # not an ally piece (empty or enemy piece)
+                    if possiblePin is None: #1st allied piece could pinned
+                        possiblePin = (endSq, d)
+                    else:   #2nd allied piece, so no pin or check is possible in this direction
+                        break
+                elif endPiece & enemyColor:
+                    types = endPiece & TYPE_MASK
+                    #5 posibilities here in this complex conditional
+                    #1.) orthogonally away from king and piece is a rook
+                    #2.) diagonally away from king and piece is a bishop
+                    #3.) 1 square away diagonally from king and piece is a pawn
+                    #4.) any direction and piece is a queen
+                    #5.) any direction 1 square away and piece is a king (this is necessaty to prevent a king move to a square controlled by another king)
+                    if(0 <= j <= 3 and types == ROOK) or \
+                    (4 <= j <= 7 and types == BISHOP) or \
+                    (i == 1 and types == PAWN and ((enemyColor == WHITE and 6 <= j <= 7) or (enemyColor == BLACK and 4 <= j <= 5))) or \
+                    (types == QUEEN) or (i == 1 and types == KING):
+                        if possiblePin is None: #no piece blocking, so check
+                            inCheck = True
+                            checks.append((endSq, d))
+                        else: #piece is blocking so pin
+                            pins.append(possiblePin)
+                    break #no more pins or checks past an enemy piece
         #check for knight checks
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
-        for m in knightMoves:
-            endRow = startRow + m[0] 
-            endCol = startCol + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] ==  enemyColor and endPiece[1] == 'N': #enemy knight attacking king
-                    inCheck = True
-                    checks.append((endRow, endCol, m[0], m[1]))
+        enemyKnight = enemyColor | KNIGHT
+        for endSq in KNIGHT_TARGETS[startSq]:
+            if squares[endSq] == enemyKnight: #enemy knight attacking king
+                inCheck = True
+                checks.append((endSq, endSq - startSq))
         return inCheck, pins, checks
 
+    '''
+    Counts the leaf nodes of the legal move tree of the given depth, the standard check of a move generator.
+    The last ply is counted from the length of the move list without making the moves.
+    '''
+    def perft(self, depth):
+        if depth == 0:
+            return 1
+        moves = self.get_valid_moves()
+        if depth == 1:
+            return len(moves)
+        nodes = 0
+        for move in moves:
+            self.make_move(move)
+            nodes += self.perft(depth - 1)
+            self.undo_move()
+        return nodes
+
+    '''
+    perft split by root move: returns a dictionary of move notation -> number of leaf nodes below it,
+    to find the move where a wrong count comes from
+    '''
+    def divide(self, depth):
+        counts = {}
+        for move in self.get_valid_moves():
+            self.make_move(move)
+            counts[Move.from_code(move).get_chess_notation()] = self.perft(depth - 1)
+            self.undo_move()
+        return counts
+
+    '''
+    Returns the valid move written in standard algebraic notation ("e4", "Nbd7", "exd6", "O-O", "e8=Q+").
+    Check marks and annotations are ignored, the move is returned as a Move. Raises ValueError if no valid move, or
+    more than one, matches.
+    '''
+    def parse_san(self, san):
+        text = san.rstrip("+#!?")
+        validMoves = self.get_valid_move_objects()
+        if text in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            endCol = 6 if len(text) == 3 else 2
+            matches = [move for move in validMoves if move.castle and move.endCol == endCol]
+        else:
+            match = sanPattern.match(text)
+            if match is None:
+                raise ValueError("Not a move in algebraic notation: " + san)
+            pieceLetter, fromFile, fromRank, endSquare, promotionLetter = match.groups()
+            pieceType = fenPieces[pieceLetter] & TYPE_MASK if pieceLetter else PAWN
+            endRow, endCol = Move.ranksToRows[endSquare[1]], Move.filesToCols[endSquare[0]]
+            promotionType = fenPieces[promotionLetter[-1]] & TYPE_MASK if promotionLetter else None
+            matches = [move for move in validMoves
+                       if move.pieceMoved & TYPE_MASK == pieceType and move.endRow == endRow and move.endCol == endCol
+                       and (fromFile is None or move.startCol == Move.filesToCols[fromFile])
+                       and (fromRank is None or move.startRow == Move.ranksToRows[fromRank])
+                       and (not move.isPawnPromotion or move.promotionPiece & TYPE_MASK == (promotionType or QUEEN))
+                       and (promotionType is None or move.isPawnPromotion)]
+        if len(matches) != 1:
+            raise ValueError(("Ambiguous move: " if matches else "Illegal move: ") + san)
+        return matches[0]
+
+    '''
+    Writes a valid move of the position in standard algebraic notation, with + or # when it gives check or mate.
+    The opposite of parse_san, move can be a packed int or a Move.
+    '''
+    def get_san(self, move):
+        if type(move) is not Move:
+            move = Move.from_code(move)
+        validMoves = self.get_valid_move_objects()
+        pieceType = move.pieceMoved & TYPE_MASK
+        target = move.get_rank_file(move.endRow, move.endCol)
+        if move.castle:
+            san = "O-O" if move.endCol == 6 else "O-O-O"
+        elif pieceType == PAWN:
+            san = (move.colsToFiles[move.startCol] + "x" if move.pieceCaptured != EMPTY else "") + target
+            if move.isPawnPromotion:
+                san += "=" + fenLetters[WHITE | move.promotionPiece & TYPE_MASK]
+        else:
+            #other pieces of the same type that can go to the same square
+            others = [other for other in validMoves if other.pieceMoved == move.pieceMoved and
+                      other.endSq == move.endSq and other.startSq != move.startSq]
+            if not others:
+                origin = ""
+            elif all(other.startCol != move.startCol for other in others):
+                origin = move.colsToFiles[move.startCol]
+            elif all(other.startRow != move.startRow for other in others):
+                origin = move.rowsToRanks[move.startRow]
+            else:
+                origin = move.get_rank_file(move.startRow, move.startCol)
+            san = fenLetters[WHITE | pieceType] + origin + ("x" if move.pieceCaptured != EMPTY else "") + target
+        self.make_move(move)
+        self.get_valid_moves()
+        if self.checkMate:
+            san += "#"
+        elif self.inCheck:
+            san += "+"
+        self.undo_move()
+        self.get_valid_moves() #restore checkMate, staleMate and inCheck of this position
+        return san
+
+    '''
+    Creates a GameState from a FEN string. The move counters are optional and default to "0 1".
+    Raises ValueError if the string is not a valid FEN with one king of each color, or if the side that just moved is
+    still in check, which no legal move leaves behind.
+    '''
+    @classmethod
+    def from_fen(cls, fen):
+        fields = fen.split()
+        if len(fields) not in (4, 6):
+            raise ValueError("FEN needs 4 or 6 fields: " + fen)
+        placement, sideToMove, castling, enpassant = fields[:4]
+        board = []
+        for rankText in placement.split('/'):
+            row = []
+            for char in rankText:
+                if char in "12345678":
+                    row.extend(["--"] * int(char))
+                elif char in fenPieces:
+                    row.append(pieceNames[fenPieces[char]])
+                else:
+                    raise ValueError("Bad piece letter '" + char + "' in FEN: " + fen)
+            if len(row) != 8:
+                raise ValueError("Every rank needs 8 squares in FEN: " + fen)
+            board.append(row)
+        if len(board) != 8:
+            raise ValueError("FEN needs 8 ranks: " + fen)
+        if sideToMove not in ('w', 'b'):
+            raise ValueError("Side to move must be w or b in FEN: " + fen)
+        if castling != '-' and (not castling or any(c not in "KQkq" for c in castling)):
+            raise ValueError("Bad castling field in FEN: " + fen)
+        if enpassant != '-' and (len(enpassant) != 2 or enpassant[0] not in Move.filesToCols or enpassant[1] not in "36"):
+            raise ValueError("Bad en passant square in FEN: " + fen)
+
+        if sum(row.count("wK") for row in board) != 1 or sum(row.count("bK") for row in board) != 1:
+            raise ValueError("FEN needs exactly one king of each color: " + fen)
+        halfmoveClock, fullmoveNumber = 0, 1
+        if len(fields) == 6:
+            try:
+                halfmoveClock, fullmoveNumber = int(fields[4]), int(fields[5])
+            except ValueError:
+                raise ValueError("Move counters must be numbers in FEN: " + fen)
+
+        gs = cls()
+        gs.board = board
+        gs.set_state(sideToMove == 'w', CastleRights('K' in castling, 'k' in castling, 'Q' in castling, 'q' in castling),
+                     () if enpassant == '-' else (Move.ranksToRows[enpassant[1]], Move.filesToCols[enpassant[0]]),
+                     halfmoveClock, fullmoveNumber)
+        if gs.whiteToMove and gs.square_under_attack(gs.blackKingSquare, BLACK) or \
+           not gs.whiteToMove and gs.square_under_attack(gs.whiteKingSquare, WHITE):
+            raise ValueError("The side not to move can't be in check in FEN: " + fen)
+        return gs
+
+    '''
+    Returns the FEN string of the current position
+    '''
+    def to_fen(self):
+        ranks = []
+        for r in range(8):
+            rankText = ""
+            emptySquares = 0
+            for c in range(8):
+                piece = self.squares[21 + r * 10 + c]
+                if piece == EMPTY:
+                    emptySquares += 1
+                else:
+                    if emptySquares:
+                        rankText += str(emptySquares)
+                        emptySquares = 0
+                    rankText += fenLetters[piece]
+            if emptySquares:
+                rankText += str(emptySquares)
+            ranks.append(rankText)
+        castleRights = self.currentCastlingRights
+        castling = ('K' if castleRights.wks else '') + ('Q' if castleRights.wqs else '') + \
+                   ('k' if castleRights.bks else '') + ('q' if castleRights.bqs else '')
+        if self.enpassantPossible != ():
+            enpassant = Move.colsToFiles[self.enpassantPossible[1]] + Move.rowsToRanks[self.enpassantPossible[0]]
+        else:
+            enpassant = '-'
+        return " ".join(("/".join(ranks), 'w' if self.whiteToMove else 'b', castling or '-', enpassant,
+                         str(self.halfmoveClock), str(self.fullmoveNumber)))
+
+    '''
+    Returns a PositionSnapshot of the current position. It has the same small size however long the game is,
+    so it is what gets sent to the AI process instead of the GameState with its logs.
+    '''
+    def snapshot(self):
+        castleRights = self.currentCastlingRights
+        return PositionSnapshot(self.board_bytes(), self.whiteToMove,
+                                (castleRights.wks, castleRights.bks, castleRights.wqs, castleRights.bqs),
+                                self.enpassantPossible, self.halfmoveClock, self.fullmoveNumber)
+
+    '''
+    The 64 piece codes of the board as bytes, a8 first
+    '''
+    def board_bytes(self):
+        return bytes(self.squares[sq] for sq in SQUARE_120)
+
+    '''
+    Creates a GameState with the position of a PositionSnapshot and an empty move log
+    '''
+    @classmethod
+    def from_snapshot(cls, snapshot):
+        gs = cls()
+        gs.load_squares(snapshot.board)
+        gs.set_state(snapshot.whiteToMove, CastleRights(*snapshot.castlingRights), snapshot.enpassantPossible,
+                     snapshot.halfmoveClock, snapshot.fullmoveNumber)
+        return gs
 
-    def update_castle_rights(self, move):
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRights.wks = False 
-            self.currentCastlingRights.wqs = False 
-        elif move.pieceMoved == 'bK':
+    '''
+    Computes the zobrist key of the current position from scratch. make_move and undo_move keep self.zobristKey
+    up to date incrementally, this is only needed to set up a new position or to verify the incremental key.
+    '''
+    def compute_zobrist_key(self):
+        key = 0
+        for sq in SQUARE_120:
+            key ^= zobristPieces[self.squares[sq]][sq]
+        if not self.whiteToMove:
+            key ^= zobristBlackToMove
+        key ^= self.castle_rights_key(self.currentCastlingRights)
+        if self.enpassantPossible != ():
+            key ^= zobristEnpassant[self.enpassantPossible[1]]
+        return key
+
+    '''
+    Computes the middlegame and endgame piece-square sums and the game phase of the board from scratch,
+    like compute_zobrist_key they are kept up to date incrementally afterwards
+    '''
+    def compute_piece_square_scores(self):
+        midgameScore = endgameScore = gamePhase = 0
+        for sq in SQUARE_120:
+            piece = self.squares[sq]
+            midgameScore += midgameScores[piece][sq]
+            endgameScore += endgameScores[piece][sq]
+            gamePhase += phaseWeights[piece]
+        return midgameScore, endgameScore, gamePhase
+
+    '''
+    XOR of the zobrist keys of the castling rights that are still available
+    '''
+    @staticmethod
+    def castle_rights_key(castleRights):
+        key = 0
+        if castleRights.wks:
+            key ^= zobristCastling['wks']
+        if castleRights.bks:
+            key ^= zobristCastling['bks']
+        if castleRights.wqs:
+            key ^= zobristCastling['wqs']
+        if castleRights.bqs:
+            key ^= zobristCastling['bqs']
+        return key
+
+    '''
+    Takes away the castling rights a move from startSq to endSq gives up: moving the king or a rook, or capturing a
+    rook on its starting square
+    '''
+    def update_castle_rights(self, startSq, endSq, pieceMoved, pieceCaptured):
+        if pieceMoved == WHITE | KING:
+            self.currentCastlingRights.wks = False
+            self.currentCastlingRights.wqs = False
+        elif pieceMoved == BLACK | KING:
             self.currentCastlingRights.bks = False
             self.currentCastlingRights.bqs = False
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 7: #right rook
+        elif pieceMoved == WHITE | ROOK:
+            startRow, startCol = ROW_COL[startSq]
+            if startRow == 7:
+                if startCol == 7: #right rook
                     self.currentCastlingRights.wks = False
-                elif move.startCol == 0: #left rook
+                elif startCol == 0: #left rook
                     self.currentCastlingRights.wqs = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 7: #right rook
+        elif pieceMoved == BLACK | ROOK:
+            startRow, startCol = ROW_COL[startSq]
+            if startRow == 0:
+                if startCol == 7: #right rook
                     self.currentCastlingRights.bks = False
-                elif move.startCol == 0: #left rook
+                elif startCol == 0: #left rook
+                    self.currentCastlingRights.bqs = False
+        #a rook captured on its starting square can't castle any more
+        if pieceCaptured == WHITE | ROOK:
+            endRow, endCol = ROW_COL[endSq]
+            if endRow == 7:
+                if endCol == 7:
+                    self.currentCastlingRights.wks = False
+                elif endCol == 0:
+                    self.currentCastlingRights.wqs = False
+        elif pieceCaptured == BLACK | ROOK:
+            endRow, endCol = ROW_COL[endSq]
+            if endRow == 0:
+                if endCol == 7:
+                    self.currentCastlingRights.bks = False
+                elif endCol == 0:
                     self.currentCastlingRights.bqs = False
 
 
+"""
+Immutable copy of a position that pickles to a few dozen bytes: board holds the 64 piece codes (a8 first) as bytes,
+castlingRights is (wks, bks, wqs, bqs) and enpassantPossible is a (row, col) tuple or ()
+"""
+PositionSnapshot = namedtuple("PositionSnapshot", ["board", "whiteToMove", "castlingRights", "enpassantPossible",
+                                                   "halfmoveClock", "fullmoveNumber"])
+
 class CastleRights():
     def __init__(self, wks, bks, wqs, bqs):
         self.wks = wks
@@ -562,34 +1092,65 @@ class Move():
                    "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
-    def __init__(self, startsq, endsq, board, enPassant = False, isPawnPromotion = False, castle = False):
-        self.startRow = startsq[0]
-        self.startCol = startsq[1]
-        self.endRow = endsq[0]
-        self.endCol = endsq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        #en passant
-        self.enPassant = enPassant
+    #no __dict__, a Move is only built at the edges: for the GUI, for printing and for the moves the search returns
+    __slots__ = ("code", "moveID", "startSq", "endSq", "startRow", "startCol", "endRow", "endCol", "pieceMoved",
+                 "pieceCaptured", "enPassant", "isPawnPromotion", "promotionPiece", "castle")
+
+    '''
+    startsq and endsq are (row, col) tuples, squares is the GameState.squares mailbox the move is made on.
+    A pawn move to the last rank is always a promotion, to a queen unless promotionPiece says otherwise.
+    '''
+    def __init__(self, startsq, endsq, squares, enPassant = False, isPawnPromotion = False, castle = False, promotionPiece = QUEEN):
+        startSq = 21 + startsq[0] * 10 + startsq[1]
+        endSq = 21 + endsq[0] * 10 + endsq[1]
+        pieceMoved = squares[startSq]
+        pieceCaptured = pieceMoved ^ (WHITE | BLACK) if enPassant else squares[endSq] #enpassant captures opposite colored pawn
         #pawn promotion
-        self.isPawnPromotion = isPawnPromotion
-        self.castle = castle
-        if enPassant:
-            self.pieceCaptured = 'bp' if self.pieceMoved == 'wp' else 'wp' #enpassant captures opposite colored pawn
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
+        if not (isPawnPromotion or (pieceMoved & TYPE_MASK == PAWN and endsq[0] in (0, 7))):
+            promotionPiece = EMPTY
+        self.unpack(encode_move(startSq, endSq, pieceMoved, pieceCaptured, promotionPiece, enPassant, castle))
 
     '''
-    Overriding the equals method
+    The Move of a packed int move
+    '''
+    @classmethod
+    def from_code(cls, code):
+        move = cls.__new__(cls)
+        move.unpack(code)
+        return move
+
+    def unpack(self, code):
+        self.code = code
+        self.moveID = code & MOVE_ID_MASK #the 4 promotions of a pawn move are different moves
+        self.startSq = code & SQUARE_MASK
+        self.endSq = code >> END_SHIFT & SQUARE_MASK
+        self.startRow, self.startCol = ROW_COL[self.startSq]
+        self.endRow, self.endCol = ROW_COL[self.endSq]
+        self.pieceMoved = code >> MOVED_SHIFT & PIECE_MASK
+        self.pieceCaptured = code >> CAPTURED_SHIFT & PIECE_MASK
+        self.enPassant = bool(code & EN_PASSANT_FLAG)
+        self.castle = bool(code & CASTLE_FLAG)
+        promotionType = code >> PROMOTION_SHIFT & TYPE_MASK
+        self.isPawnPromotion = promotionType != EMPTY
+        self.promotionPiece = (self.pieceMoved & (WHITE | BLACK)) | promotionType if self.isPawnPromotion else EMPTY
+
+    '''
+    Overriding the equals method, a Move also equals the packed int of the same move
     '''
     def __eq__(self, other):
         if isinstance(other, Move):
             return self.moveID == other.moveID
+        if isinstance(other, int):
+            return self.moveID == other & MOVE_ID_MASK
         return False
-    
+
 
     def get_chess_notation(self):
         #you can add to make this like real chess notation
-        return self.get_rank_file(self.startRow, self.startCol) + self.get_rank_file(self.endRow, self.endCol)
+        notation = self.get_rank_file(self.startRow, self.startCol) + self.get_rank_file(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += pieceNames[self.promotionPiece][1].lower()
+        return notation
 
     def get_rank_file(self, r, c):
         return self.colsToFiles[c] + self.rowsToRanks[r]
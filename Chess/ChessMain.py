@@ -4,12 +4,13 @@ This is our main driver file. It will be responsible for handling user input and
 import pygame as p
 import ChessEngine, SmartMoveFinder
 import time
-from multiprocessing import Process, Queue
+from SearchWorker import SearchWorker
 
 WIDTH = HEIGHT = 512
 DIMENSION = 8 #Dimensions of a chess board are 8x8
 SQ_SIZE = HEIGHT // DIMENSION
 MAX_FPS = 15 #Animations
+PONDER = True #let the AI search the reply it expects while the human is thinking
 IMAGES = {}
 
 '''
@@ -33,7 +34,7 @@ def main():
     clock = p.time.Clock()
     screen.fill(p.Color("white"))
     gs = ChessEngine.GameState()
-    validMoves = gs.get_valid_moves()
+    validMoves = gs.get_valid_move_objects()
     moveMade = False #flag variable for when a move is made
 
     load_images() #only do this one, before the while loop
@@ -44,7 +45,8 @@ def main():
     playerOne = True #If a human is playing white, then this will be true, if an AI is playing, then false
     playerTwo = False #Same as above but for black 
     AIThinking = False
-    moveFinderProcess = False
+    moveUndone = False
+    searchWorker = SearchWorker() #AI process that lives for the whole game
     while running:
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
         for e in p.event.get():
@@ -63,11 +65,13 @@ def main():
                         sqSelected = (row, col)
                         playerClicks.append(sqSelected) #sppend for both 1st and 2nd clicks
                     if len(playerClicks) == 2: #after 2nd click
-                        move = ChessEngine.Move(playerClicks[0], playerClicks[1], gs.board)
+                        move = ChessEngine.Move(playerClicks[0], playerClicks[1], gs.squares)
                         print(move.get_chess_notation())
                         for i in range(len(validMoves)):
                             if move == validMoves[i]:
                                 gs.make_move(validMoves[i])
+                                if searchWorker.ponder_hit(validMoves[i]): #the AI already searched this move
+                                    AIThinking = True
                                 moveMade = True
                                 sqSelected = () #reset user clicks
                                 playerClicks = []
@@ -79,18 +83,18 @@ def main():
                     gs.undo_move()
                     moveMade = True
                     gameOver = False
-                    if AIThinking:
-                       moveFinderProcess.terminate()
+                    if AIThinking or searchWorker.pondering:
+                       searchWorker.stop()
                        AIThinking = False
                     moveUndone = True
                 if e.key == p.K_r: #redo when 'r' is pressed
                     gs = ChessEngine.GameState()
-                    validMoves = gs.get_valid_moves()
+                    validMoves = gs.get_valid_move_objects()
                     playerClicks = []
                     moveMade = False
                     gameOver = False
-                    if AIThinking:
-                       moveFinderProcess.terminate()
+                    if AIThinking or searchWorker.pondering:
+                       searchWorker.stop()
                        AIThinking = False
                     moveUndone = True
 
@@ -99,20 +103,22 @@ def main():
             if not AIThinking:
                 AIThinking = True
                 print("thinking....")
-                returnQueue = Queue() #used to pass data between threads
-                moveFinderProcess = Process(target=SmartMoveFinder.find_best_move, args=(gs, validMoves, returnQueue))
-                moveFinderProcess.start() #call find_best_move(gs, validMoves, returnQueue)
+                searchWorker.start_search(gs.snapshot())
 
-            if not moveFinderProcess.is_alive():
-                AIMove = returnQueue.get()
+            if searchWorker.search_done():
+                AIMove = searchWorker.bestMove
+                if searchWorker.stats is not None:
+                    print(searchWorker.stats)
                 if AIMove is None:
                     AIMove = SmartMoveFinder.find_random_move(validMoves)
                 gs.make_move(AIMove)
                 moveMade = True
                 AIThinking = False
+                if PONDER and ((gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)):
+                    searchWorker.ponder(gs)
     
         if moveMade:
-            validMoves = gs.get_valid_moves()
+            validMoves = gs.get_valid_move_objects()
             moveMade = False
             moveUndone = False
 
@@ -127,6 +133,7 @@ def main():
             
         clock.tick(MAX_FPS)
         p.display.flip()
+    searchWorker.close()
 
 
 
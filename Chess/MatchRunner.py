@@ -0,0 +1,332 @@
+"""
+Headless engine against engine matches, to tell whether a change to SmartMoveFinder makes the engine stronger.
+Two configurations of SmartMoveFinder, given as settings of its module constants, play each other from a set of
+opening positions, every opening twice with the colors swapped, on a pool of processes with a fixed depth, time or
+node budget per move. Finished games are streamed to a PGN and/or a JSONL file as they come in.
+The result is the Elo difference of the first engine with a 95% error margin, and a sequential probability ratio
+test (SPRT) of elo0 against elo1 stops the match as soon as one of them is accepted. Throughput is reported in
+games per hour on stderr. Run from the Chess folder:
+    python MatchRunner.py --engine1 NULL_MOVE_PRUNING=False --engine2 [--games N] [--depth N | --movetime S | --nodes N]
+                          [--openings openings.epd] [--workers N] [--pgn match.pgn] [--jsonl match.jsonl]
+Settings are NAME=value with a Python literal value, e.g. DEPTH=4 EVALUATOR='knights' ASPIRATION_WINDOW=None.
+"""
+import argparse
+import ast
+import datetime
+import json
+import math
+import os
+import queue
+import sys
+import time
+from multiprocessing import Pool
+import ChessEngine
+import SmartMoveFinder
+from BatchAnalyzer import read_epd_positions
+from TranspositionTable import TranspositionTable
+
+DEFAULT_GAMES = 100
+MAX_PLIES = 300 #games still going after this many plies are adjudicated a draw
+REPORT_INTERVAL = 10 #seconds between two progress reports
+SPRT_MIN_GAMES = 20 #the normal approximation of the log likelihood ratio means nothing on a handful of games
+
+#a few plies of the main openings, so the games don't all start the same way
+DEFAULT_OPENINGS = [
+    ChessEngine.START_FEN,
+    "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pppp1ppp/4p3/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/pp1ppppp/2p5/8/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/ppp1pppp/8/3p4/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkb1r/pppppppp/5n2/8/3P4/8/PPP1PPPP/RNBQKBNR w KQkq - 1 2",
+    "rnbqkbnr/pppp1ppp/8/4p3/2P5/8/PP1PPPPP/RNBQKBNR w KQkq - 0 2",
+    "rnbqkbnr/ppp1pppp/8/3p4/8/5N2/PPPPPPPP/RNBQKB1R w KQkq - 1 2",
+]
+
+#state of a match process, set up by init_worker
+engineSettings = [] #the full settings of SmartMoveFinder for each of the two engines
+engineTables = [] #(transposition table, history table) of each engine, kept apart so they don't share what they learned
+
+
+"""
+Turns ["NAME=value", ...] into a dictionary of SmartMoveFinder settings. Raises ValueError for a name that isn't
+an upper case setting of SmartMoveFinder or a value that isn't a Python literal.
+"""
+def parse_settings(texts):
+    settings = {}
+    for text in texts:
+        name, separator, value = text.partition("=")
+        if not separator or not name.isupper() or not hasattr(SmartMoveFinder, name):
+            raise ValueError("Not a SmartMoveFinder setting: " + text)
+        try:
+            settings[name] = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            raise ValueError("Setting value is not a Python literal: " + text)
+    return settings
+
+"""
+Pool initializer: records the settings of both engines on top of the match defaults, no opening book (the openings
+come from the match), no parallel search inside a match process and no stats logging
+"""
+def init_worker(settings1, settings2):
+    SmartMoveFinder.BOOK_FILE = None
+    SmartMoveFinder.PARALLEL_WORKERS = 1
+    SmartMoveFinder.LOG_STATS = False
+    names = set(settings1) | set(settings2)
+    defaults = {name: getattr(SmartMoveFinder, name) for name in names}
+    engineSettings[:] = [dict(defaults, **settings1), dict(defaults, **settings2)]
+    engineTables[:] = [(TranspositionTable(settings.get("TT_SIZE_MB", SmartMoveFinder.TT_SIZE_MB)), {})
+                       for settings in engineSettings]
+
+"""
+Switches SmartMoveFinder over to the settings and tables of an engine
+"""
+def use_engine(engine):
+    for name, value in engineSettings[engine].items():
+        setattr(SmartMoveFinder, name, value)
+    if "EVALUATOR" in engineSettings[engine]:
+        SmartMoveFinder.set_evaluator(engineSettings[engine]["EVALUATOR"])
+    SmartMoveFinder.transpositionTable, SmartMoveFinder.historyTable = engineTables[engine]
+
+"""
+Returns (result, reason) if the game is over, (None, None) otherwise. keyCounts counts how often every position
+occured, for threefold repetition.
+"""
+def game_result(gs, validMoves, keyCounts, plies, maxPlies):
+    if not validMoves:
+        if gs.checkMate:
+            return ("0-1" if gs.whiteToMove else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if gs.halfmoveClock >= 100:
+        return "1/2-1/2", "fifty move rule"
+    if keyCounts[gs.zobristKey] >= 3:
+        return "1/2-1/2", "threefold repetition"
+    bitboards = gs.bitboards
+    majorPiecesAndPawns = 0
+    minorPieces = 0
+    for color in (ChessEngine.WHITE, ChessEngine.BLACK):
+        majorPiecesAndPawns += bitboards[color | ChessEngine.PAWN] | bitboards[color | ChessEngine.ROOK] | bitboards[color | ChessEngine.QUEEN]
+        minorPieces += bin(bitboards[color | ChessEngine.KNIGHT] | bitboards[color | ChessEngine.BISHOP]).count("1")
+    if not majorPiecesAndPawns and minorPieces <= 1:
+        return "1/2-1/2", "insufficient material"
+    if plies >= maxPlies:
+        return "1/2-1/2", "move limit"
+    return None, None
+
+"""
+Plays one game of the match from the opening FEN, engine 0 or 1 (whiteEngine) has the white pieces.
+Returns the game as a dictionary, scored from the first engine's side in "score".
+"""
+def play_game(gameNumber, opening, whiteEngine, maxDepth, timeLimit, nodeLimit, maxPlies):
+    startTime = time.perf_counter()
+    gs = ChessEngine.GameState.from_fen(opening)
+    for transpositionTable, historyTable in engineTables: #a new game for both engines
+        transpositionTable.clear()
+        historyTable.clear()
+    keyCounts = {gs.zobristKey: 1}
+    moveQueue = queue.SimpleQueue()
+    sanMoves = []
+    uciMoves = []
+    nodes = [0, 0]
+    while True:
+        validMoves = gs.get_valid_moves()
+        result, reason = game_result(gs, validMoves, keyCounts, len(uciMoves), maxPlies)
+        if result is not None:
+            break
+        engine = whiteEngine if gs.whiteToMove else 1 - whiteEngine
+        use_engine(engine)
+        SmartMoveFinder.find_best_move(gs, validMoves, moveQueue, maxDepth, timeLimit, nodeLimit, workers=1, returnStats=True)
+        move, stats = moveQueue.get()
+        if move is None: #the budget ran out before the first iteration found a move
+            move = ChessEngine.Move.from_code(validMoves[0])
+        nodes[engine] += stats.nodes
+        sanMoves.append(gs.get_san(move))
+        uciMoves.append(move.get_chess_notation())
+        gs.make_move(move)
+        keyCounts[gs.zobristKey] = keyCounts.get(gs.zobristKey, 0) + 1
+    score = {"1-0": 1.0, "0-1": 0.0}.get(result, 0.5)
+    return {"game": gameNumber, "opening": opening, "white": "engine1" if whiteEngine == 0 else "engine2",
+            "black": "engine2" if whiteEngine == 0 else "engine1", "result": result, "reason": reason,
+            "score": score if whiteEngine == 0 else 1.0 - score, "plies": len(uciMoves), "moves": uciMoves,
+            "san": sanMoves, "engine1Nodes": nodes[0], "engine2Nodes": nodes[1],
+            "seconds": round(time.perf_counter() - startTime, 3)}
+
+def play_job(arguments):
+    return play_game(*arguments)
+
+"""
+Writes a game in PGN, the players are named after the engines with their settings in the Event tag
+"""
+def write_pgn(pgnFile, game, names, event):
+    gs = ChessEngine.GameState.from_fen(game["opening"])
+    headers = [("Event", event), ("Site", "?"), ("Date", datetime.date.today().strftime("%Y.%m.%d")),
+               ("Round", str(game["game"])), ("White", names[game["white"]]), ("Black", names[game["black"]]),
+               ("Result", game["result"])]
+    if game["opening"] != ChessEngine.START_FEN:
+        headers += [("SetUp", "1"), ("FEN", game["opening"])]
+    headers += [("Termination", game["reason"]), ("PlyCount", str(game["plies"]))]
+    for name, value in headers:
+        pgnFile.write(f'[{name} "{value}"]\n')
+    tokens = []
+    moveNumber, whiteToMove = gs.fullmoveNumber, gs.whiteToMove
+    for i, san in enumerate(game["san"]):
+        if whiteToMove:
+            tokens.append(f"{moveNumber}.")
+        elif i == 0:
+            tokens.append(f"{moveNumber}...")
+        tokens.append(san)
+        if not whiteToMove:
+            moveNumber += 1
+        whiteToMove = not whiteToMove
+    tokens.append(game["result"])
+    lines = [""]
+    for token in tokens: #PGN lines stay under 80 characters
+        if len(lines[-1]) + len(token) + 1 > 79:
+            lines.append("")
+        lines[-1] += (" " if lines[-1] else "") + token
+    pgnFile.write("\n" + "\n".join(lines) + "\n\n")
+
+"""
+Elo difference that gives the expected score (0 to 1) in the logistic model
+"""
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+"""
+Mean score per game and its variance from the wins, draws and losses
+"""
+def score_statistics(wins, draws, losses):
+    games = wins + draws + losses
+    mean = (wins + 0.5 * draws) / games
+    variance = (wins * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2 + losses * mean ** 2) / games
+    return mean, variance
+
+"""
+Returns (Elo difference, 95% error margin) of the engine with these wins, draws and losses
+"""
+def elo_estimate(wins, draws, losses):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, float("inf")
+    mean, variance = score_statistics(wins, draws, losses)
+    deviation = 1.96 * math.sqrt(variance / games)
+    margin = (elo_from_score(mean + deviation) - elo_from_score(mean - deviation)) / 2
+    return elo_from_score(mean), margin
+
+"""
+Log likelihood ratio of elo1 against elo0 given the results, with the usual normal approximation of the score
+"""
+def sprt_llr(wins, draws, losses, elo0, elo1):
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0
+    mean, variance = score_statistics(wins, draws, losses)
+    if variance == 0:
+        return 0.0
+    score0, score1 = expected_score(elo0), expected_score(elo1)
+    return games * (score1 - score0) * (2 * mean - score0 - score1) / (2 * variance)
+
+"""
+(lower, upper) bounds of the log likelihood ratio for the error rates alpha (accepting elo1 when elo0 is true) and
+beta (accepting elo0 when elo1 is true)
+"""
+def sprt_bounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+"""
+Opening FENs from an EPD or FEN file, one position per line
+"""
+def read_openings(path):
+    return [fen + " 0 1" for number, fen, operations in read_epd_positions(path)]
+
+"""
+Prints the score, Elo, SPRT state and throughput of the match so far to stderr
+"""
+def report(wins, draws, losses, llr, lowerBound, upperBound, elapsed):
+    games = wins + draws + losses
+    elo, margin = elo_estimate(wins, draws, losses)
+    print(f"games {games}  +{wins} ={draws} -{losses}  elo {elo:+.1f} +- {margin:.1f}  "
+          f"LLR {llr:.2f} [{lowerBound:.2f}, {upperBound:.2f}]  {games * 3600 / max(elapsed, 1e-9):.0f} games/hour",
+          file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Play two SmartMoveFinder configurations against each other")
+    parser.add_argument("--engine1", nargs="*", default=[], metavar="NAME=VALUE", help="settings of the engine under test")
+    parser.add_argument("--engine2", nargs="*", default=[], metavar="NAME=VALUE", help="settings of the baseline")
+    parser.add_argument("--name1", default="engine1")
+    parser.add_argument("--name2", default="engine2")
+    parser.add_argument("--games", type=int, default=DEFAULT_GAMES, help="most games to play, rounded up to pairs")
+    parser.add_argument("--depth", type=int, default=None, help="search depth per move (default the DEPTH of each engine)")
+    parser.add_argument("--movetime", type=float, default=None, help="seconds per move")
+    parser.add_argument("--nodes", type=int, default=None, help="nodes per move")
+    parser.add_argument("--max-plies", type=int, default=MAX_PLIES)
+    parser.add_argument("--openings", default=None, help="EPD or FEN file of start positions")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--pgn", default=None, help="PGN file to write the games to")
+    parser.add_argument("--jsonl", default=None, help="JSONL file to write the games to")
+    parser.add_argument("--elo0", type=float, default=0.0, help="SPRT null hypothesis")
+    parser.add_argument("--elo1", type=float, default=10.0, help="SPRT alternative hypothesis")
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    args = parser.parse_args()
+    try:
+        settings1, settings2 = parse_settings(args.engine1), parse_settings(args.engine2)
+    except ValueError as e:
+        parser.error(str(e))
+    maxDepth = args.depth
+    if maxDepth is None and (args.movetime or args.nodes):
+        maxDepth = SmartMoveFinder.MAX_PLY // 2 #a time or node budget alone searches as deep as it gets
+    openings = read_openings(args.openings) if args.openings else DEFAULT_OPENINGS
+    jobs = [(i + 1, openings[i // 2 % len(openings)], i % 2, maxDepth, args.movetime, args.nodes, args.max_plies)
+            for i in range(args.games + args.games % 2)]
+    names = {"engine1": args.name1, "engine2": args.name2}
+    event = f"{args.name1} {' '.join(args.engine1)} vs {args.name2} {' '.join(args.engine2)}".strip()
+    pgnFile = open(args.pgn, "w") if args.pgn else None
+    jsonlFile = open(args.jsonl, "w") if args.jsonl else None
+    lowerBound, upperBound = sprt_bounds(args.alpha, args.beta)
+
+    wins = draws = losses = 0
+    llr = 0.0
+    verdict = None
+    startTime = lastReport = time.perf_counter()
+    with Pool(args.workers, initializer=init_worker, initargs=(settings1, settings2)) as pool:
+        for game in pool.imap_unordered(play_job, jobs):
+            if game["score"] == 1.0:
+                wins += 1
+            elif game["score"] == 0.0:
+                losses += 1
+            else:
+                draws += 1
+            if pgnFile is not None:
+                write_pgn(pgnFile, game, names, event)
+                pgnFile.flush()
+            if jsonlFile is not None:
+                jsonlFile.write(json.dumps(game) + "\n")
+                jsonlFile.flush()
+            llr = sprt_llr(wins, draws, losses, args.elo0, args.elo1)
+            if wins + draws + losses >= SPRT_MIN_GAMES:
+                if llr <= lowerBound:
+                    verdict = f"H0 accepted (elo {args.elo0:g})"
+                elif llr >= upperBound:
+                    verdict = f"H1 accepted (elo {args.elo1:g})"
+            now = time.perf_counter()
+            if verdict is None and now - lastReport >= REPORT_INTERVAL:
+                lastReport = now
+                report(wins, draws, losses, llr, lowerBound, upperBound, now - startTime)
+            if verdict is not None:
+                break #leaving the with block stops the games still running
+    elapsed = time.perf_counter() - startTime
+    report(wins, draws, losses, llr, lowerBound, upperBound, elapsed)
+    print("SPRT: " + (verdict or "no decision"), file=sys.stderr)
+    for outputFile in (pgnFile, jsonlFile):
+        if outputFile is not None:
+            outputFile.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,166 @@
+"""
+Opening book in the Polyglot file layout: a file of 16 byte big-endian entries (position key: 8 bytes, move: 2 bytes,
+weight: 2 bytes, learn: 4 bytes) sorted by key, a position can have several entries, one per book move.
+The key is GameState.zobristKey, not the Polyglot hash, so books have to be built with build_book from PGN games.
+Moves are packed the Polyglot way: to file in bits 0-2, to rank in bits 3-5, from file in bits 6-8, from rank in
+bits 9-11 (rank 0 is the 1st rank) and the promotion piece in bits 12-14 (1 knight, 2 bishop, 3 rook, 4 queen);
+castling is written as the king taking its own rook (e1h1).
+The file is read through mmap with a binary search, so opening a book costs nothing and every process that uses
+the same book shares its pages. Build a book from the Chess folder with:
+    python OpeningBook.py games.pgn [more.pgn ...] --output book.bin [--plies 20] [--min-count 2]
+"""
+import argparse
+import mmap
+import os
+import random
+import struct
+import ChessEngine
+from ChessEngine import KNIGHT, BISHOP, ROOK, QUEEN, TYPE_MASK
+
+ENTRY = struct.Struct(">QHHI")
+ENTRY_SIZE = ENTRY.size #16 bytes
+KEY = struct.Struct(">Q")
+MAX_WEIGHT = 0xFFFF
+
+#promotion piece type <-> the 3 bits of a Polyglot move
+promotionCodes = {KNIGHT: 1, BISHOP: 2, ROOK: 3, QUEEN: 4}
+promotionTypes = {code: pieceType for pieceType, code in promotionCodes.items()}
+
+
+"""
+Packs a Move into the 16 bit Polyglot move
+"""
+def encode_move(move):
+    endCol = move.endCol
+    if move.castle: #the king "takes" the rook
+        endCol = 7 if move.endCol > move.startCol else 0
+    code = endCol | (7 - move.endRow) << 3 | move.startCol << 6 | (7 - move.startRow) << 9
+    if move.isPawnPromotion:
+        code |= promotionCodes[move.promotionPiece & TYPE_MASK] << 12
+    return code
+
+"""
+Returns the valid move a 16 bit Polyglot move stands for, None if it isn't valid in the position
+"""
+def decode_move(code, validMoves):
+    endCol, endRow = code & 7, 7 - (code >> 3 & 7)
+    startCol, startRow = code >> 6 & 7, 7 - (code >> 9 & 7)
+    promotionType = promotionTypes.get(code >> 12 & 7)
+    for move in validMoves:
+        if move.startRow != startRow or move.startCol != startCol:
+            continue
+        moveEndCol = (7 if move.endCol > move.startCol else 0) if move.castle else move.endCol
+        if move.endRow == endRow and moveEndCol == endCol and \
+                (not move.isPawnPromotion or move.promotionPiece & TYPE_MASK == promotionType):
+            return move
+    return None
+
+
+class OpeningBook():
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.numEntries = len(self.map) // ENTRY_SIZE
+
+    def close(self):
+        self.map.close()
+        self.file.close()
+
+    '''
+    Returns the (key, move, weight, learn) entries stored for a zobrist key
+    '''
+    def entries(self, key):
+        low, high = 0, self.numEntries
+        while low < high: #first entry with a key >= key
+            middle = (low + high) // 2
+            if KEY.unpack_from(self.map, middle * ENTRY_SIZE)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.numEntries:
+            entry = ENTRY.unpack_from(self.map, low * ENTRY_SIZE)
+            if entry[0] != key:
+                break
+            entries.append(entry)
+            low += 1
+        return entries
+
+    '''
+    Returns the book moves of the position as a list of (Move, weight), the moves that aren't valid are left out.
+    validMoves are packed moves as GameState.get_valid_moves returns them.
+    '''
+    def get_moves(self, gs, validMoves=None):
+        entries = self.entries(gs.zobristKey)
+        if not entries:
+            return []
+        validMoves = gs.get_valid_moves() if validMoves is None else validMoves
+        validMoves = [ChessEngine.Move.from_code(move) for move in validMoves]
+        bookMoves = []
+        for key, code, weight, learn in entries:
+            move = decode_move(code, validMoves)
+            if move is not None:
+                bookMoves.append((move, weight))
+        return bookMoves
+
+    '''
+    Picks a book move for the position, at random in proportion to the weights, or the heaviest one when randomly is
+    False. Returns None when the position isn't in the book.
+    '''
+    def choose_move(self, gs, validMoves=None, randomly=True):
+        bookMoves = [(move, weight) for move, weight in self.get_moves(gs, validMoves) if weight > 0]
+        if not bookMoves:
+            return None
+        if randomly:
+            return random.choices([move for move, weight in bookMoves], weights=[weight for move, weight in bookMoves])[0]
+        return max(bookMoves, key=lambda bookMove: bookMove[1])[0]
+
+"""
+Opens the book at path, None if there is no such file
+"""
+def open_book(path):
+    if path is None or not os.path.exists(path) or os.path.getsize(path) < ENTRY_SIZE:
+        return None
+    return OpeningBook(path)
+
+"""
+Writes a book of the moves played in the first plies of the PGN games. The weight of a move is how often it was
+played in the position, moves played fewer than minCount times are left out.
+"""
+def build_book(pgnPaths, outputPath, plies=20, minCount=1):
+    from BatchAnalyzer import read_pgn_games #only needed to build books
+    counts = {}
+    for path in pgnPaths:
+        for headers, sanMoves in read_pgn_games(path):
+            if "FEN" in headers:
+                continue
+            gs = ChessEngine.GameState()
+            for san in sanMoves[:plies]:
+                try:
+                    move = gs.parse_san(san)
+                except ValueError:
+                    break
+                entry = (gs.zobristKey, encode_move(move))
+                counts[entry] = counts.get(entry, 0) + 1
+                gs.make_move(move)
+    entries = sorted((key, code, min(count, MAX_WEIGHT)) for (key, code), count in counts.items() if count >= minCount)
+    with open(outputPath, "wb") as bookFile:
+        for key, code, weight in entries:
+            bookFile.write(ENTRY.pack(key, code, weight, 0))
+    return len(entries)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build an opening book from PGN games")
+    parser.add_argument("files", nargs="+", help=".pgn files")
+    parser.add_argument("--output", default="book.bin")
+    parser.add_argument("--plies", type=int, default=20, help="book moves per game")
+    parser.add_argument("--min-count", type=int, default=1, help="leave out moves played fewer times")
+    args = parser.parse_args()
+    numEntries = build_book(args.files, args.output, args.plies, args.min_count)
+    print(f"{numEntries} entries written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
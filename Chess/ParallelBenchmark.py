@@ -0,0 +1,67 @@
+"""
+Benchmark of the parallel root search in SmartMoveFinder.
+Searches a few test positions to a fixed depth with 1, 2, 4 and 8 processes and reports the time, the speedup over
+one process and whether the best score matches the one process search. Run from the Chess folder:
+    python ParallelBenchmark.py [--depth N] [--workers 1 2 4 8] [--position NAME ...]
+"""
+import argparse
+import os
+import time
+import ChessEngine
+import SmartMoveFinder
+from PerftBenchmark import PERFT_POSITIONS
+
+BENCHMARK_POSITIONS = ["start", "kiwipete", "position4", "position6"]
+DEFAULT_DEPTH = 3
+DEFAULT_WORKERS = [1, 2, 4, 8]
+
+
+"""
+Searches one position with the given number of processes from an empty transposition table,
+returns (move, score, nodes, seconds)
+"""
+def run_search(name, depth, workers):
+    gs = ChessEngine.GameState.from_fen(PERFT_POSITIONS[name][0])
+    validMoves = gs.get_valid_moves()
+    SmartMoveFinder.transpositionTable.clear()
+    SmartMoveFinder.historyTable.clear()
+    if workers > 1:
+        SmartMoveFinder.get_root_search_pool(workers) #start the processes before the clock
+    startTime = time.perf_counter()
+    if workers > 1:
+        move, score, pv = SmartMoveFinder.parallel_root_search(gs, validMoves, workers, maxDepth=depth)
+    else:
+        move, score, pv = SmartMoveFinder.iterative_deepening(gs, validMoves, maxDepth=depth)
+    elapsed = time.perf_counter() - startTime
+    return move, score, SmartMoveFinder.nodeCount, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parallel root search speedup benchmark")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--workers", type=int, nargs="*", default=DEFAULT_WORKERS)
+    parser.add_argument("--position", nargs="*", choices=sorted(PERFT_POSITIONS), default=BENCHMARK_POSITIONS)
+    args = parser.parse_args()
+
+    print(f"{os.cpu_count()} CPUs, depth {args.depth}")
+    totalTimes = {workers: 0.0 for workers in args.workers}
+    for name in args.position:
+        serialScore = None
+        for workers in args.workers:
+            #the 1 process search from a fresh table so its score is the reference, its time is not used below
+            if serialScore is None:
+                serialMove, serialScore, serialNodes, serialTime = run_search(name, args.depth, 1)
+            move, score, nodes, elapsed = run_search(name, args.depth, workers)
+            totalTimes[workers] += elapsed
+            status = "same score" if score == serialScore else "SCORE DIFFERS from " + str(serialScore)
+            print(f"{name:10} workers {workers}  move {move.get_chess_notation():6} score {score:7.2f}  nodes {nodes:>8}"
+                  f"  {elapsed:7.2f}s  speedup {serialTime / max(elapsed, 1e-9):5.2f}  {status}")
+    baseTime = totalTimes.get(1)
+    for workers in args.workers:
+        speedup = f"  speedup {baseTime / max(totalTimes[workers], 1e-9):5.2f}" if baseTime is not None else ""
+        print(f"{'total':10} workers {workers}  {totalTimes[workers]:7.2f}s{speedup}")
+    SmartMoveFinder.close_root_search_pool()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Perft benchmark and correctness check for the move generator in ChessEngine.
+Counts the legal move tree of standard test positions, compares the counts with the published ones and
+reports the speed in nodes per second. Exits with status 1 if any count is wrong, so it can gate every
+change to the move generator. Run from the Chess folder:
+    python PerftBenchmark.py [--depth N] [--position NAME ...] [--divide]
+"""
+import argparse
+import sys
+import time
+import ChessEngine
+
+#name -> (FEN, known number of leaf nodes at depth 1, 2, 3, ...)
+PERFT_POSITIONS = {
+    "start": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+              [20, 400, 8902, 197281, 4865609]),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862, 4085603]),
+    "position3": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                  [14, 191, 2812, 43238, 674624]),
+    "position4": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                  [6, 264, 9467, 422333]),
+    "position5": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                  [44, 1486, 62379, 2103487]),
+    "position6": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                  [46, 2079, 89890, 3894594]),
+}
+DEFAULT_DEPTH = 3
+
+
+"""
+Runs perft on one position and returns (nodes, expected nodes or None, seconds)
+"""
+def run_perft(name, depth):
+    fen, counts = PERFT_POSITIONS[name]
+    gs = ChessEngine.GameState.from_fen(fen)
+    startTime = time.perf_counter()
+    nodes = gs.perft(depth)
+    elapsed = time.perf_counter() - startTime
+    expected = counts[depth - 1] if depth <= len(counts) else None
+    return nodes, expected, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Perft benchmark and move generator check")
+    parser.add_argument("--depth", type=int, default=DEFAULT_DEPTH)
+    parser.add_argument("--position", nargs="*", choices=sorted(PERFT_POSITIONS), default=list(PERFT_POSITIONS))
+    parser.add_argument("--divide", action="store_true", help="print the node count of every root move")
+    args = parser.parse_args()
+
+    failed = False
+    totalNodes = 0
+    totalTime = 0.0
+    for name in args.position:
+        if args.divide:
+            gs = ChessEngine.GameState.from_fen(PERFT_POSITIONS[name][0])
+            for notation, count in sorted(gs.divide(args.depth).items()):
+                print(notation, count)
+        nodes, expected, elapsed = run_perft(name, args.depth)
+        totalNodes += nodes
+        totalTime += elapsed
+        if expected is None:
+            status = "?"
+        elif nodes == expected:
+            status = "OK"
+        else:
+            status = "FAIL expected " + str(expected)
+            failed = True
+        print(f"{name:10} depth {args.depth}  nodes {nodes:>10}  {elapsed:8.2f}s  {int(nodes / max(elapsed, 1e-9)):>9} nps  {status}")
+    print(f"{'total':10}          nodes {totalNodes:>10}  {totalTime:8.2f}s  {int(totalNodes / max(totalTime, 1e-9)):>9} nps")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
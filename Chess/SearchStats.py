@@ -0,0 +1,83 @@
+"""
+Counters of one search, filled in by SmartMoveFinder and kept in SmartMoveFinder.lastSearchStats.
+They are meant for tracking the speed and the move ordering of the search between versions: nodes and nodes per
+second, leaf evaluations, beta cutoffs and how many of them the first move caused, transposition table and tablebase
+hits, the nodes and time of every iteration of the iterative deepening, from which the effective branching factor follows.
+"""
+
+
+class SearchStats():
+    def __init__(self):
+        self.nodes = 0 #nodes of the search and of the quiescence search
+        self.leafEvaluations = 0 #calls of score_board
+        self.betaCutoffs = 0
+        self.firstMoveCutoffs = 0 #beta cutoffs caused by the first move searched
+        self.ttProbes = 0
+        self.ttHits = 0
+        self.tablebaseHits = 0 #nodes scored from the endgame tablebases
+        self.iterations = [] #(depth, nodes, seconds, score) of every completed iteration
+        self.depth = 0 #depth of the last completed iteration
+        self.seconds = 0.0 #time of the whole search
+        self.processes = 1
+
+    '''
+    Records a completed iteration, nodes and seconds are the ones of this iteration only
+    '''
+    def add_iteration(self, depth, nodes, seconds, score):
+        self.iterations.append((depth, nodes, seconds, score))
+        self.depth = depth
+
+    def nps(self):
+        return self.nodes / self.seconds if self.seconds > 0 else 0.0
+
+    def first_move_cutoff_rate(self):
+        return self.firstMoveCutoffs / self.betaCutoffs if self.betaCutoffs else 0.0
+
+    def tt_hit_rate(self):
+        return self.ttHits / self.ttProbes if self.ttProbes else 0.0
+
+    '''
+    How many times more nodes the last iteration took than the one before it, None with less than two iterations
+    '''
+    def effective_branching_factor(self):
+        if len(self.iterations) < 2 or self.iterations[-2][1] == 0:
+            return None
+        return self.iterations[-1][1] / self.iterations[-2][1]
+
+    '''
+    Adds the counters of a search done by another process on part of the root moves
+    '''
+    def merge(self, other):
+        self.nodes += other.nodes
+        self.leafEvaluations += other.leafEvaluations
+        self.betaCutoffs += other.betaCutoffs
+        self.firstMoveCutoffs += other.firstMoveCutoffs
+        self.ttProbes += other.ttProbes
+        self.ttHits += other.ttHits
+        self.tablebaseHits += other.tablebaseHits
+        iterations = {depth: [nodes, seconds, score] for depth, nodes, seconds, score in self.iterations}
+        for depth, nodes, seconds, score in other.iterations:
+            if depth in iterations:
+                iterations[depth][0] += nodes
+                iterations[depth][1] = max(iterations[depth][1], seconds)
+                iterations[depth][2] = max(iterations[depth][2], score)
+            else:
+                iterations[depth] = [nodes, seconds, score]
+        self.iterations = [(depth,) + tuple(iterations[depth]) for depth in sorted(iterations)]
+        self.depth = max(self.depth, other.depth)
+
+    def as_dict(self):
+        return {"nodes": self.nodes, "leafEvaluations": self.leafEvaluations, "betaCutoffs": self.betaCutoffs,
+                "firstMoveCutoffs": self.firstMoveCutoffs, "firstMoveCutoffRate": round(self.first_move_cutoff_rate(), 4),
+                "ttProbes": self.ttProbes, "ttHits": self.ttHits, "ttHitRate": round(self.tt_hit_rate(), 4),
+                "tablebaseHits": self.tablebaseHits,
+                "depth": self.depth, "seconds": round(self.seconds, 4), "nps": int(self.nps()),
+                "effectiveBranchingFactor": self.effective_branching_factor(), "processes": self.processes,
+                "iterations": [{"depth": depth, "nodes": nodes, "seconds": round(seconds, 4), "score": score}
+                               for depth, nodes, seconds, score in self.iterations]}
+
+    def __str__(self):
+        ebf = self.effective_branching_factor()
+        return (f"depth {self.depth}  nodes {self.nodes}  {self.seconds:.2f}s  {int(self.nps())} nps  "
+                f"leaves {self.leafEvaluations}  first move cutoffs {self.first_move_cutoff_rate():.0%}  "
+                f"tt hits {self.tt_hit_rate():.0%}  ebf " + (f"{ebf:.2f}" if ebf is not None else "-"))
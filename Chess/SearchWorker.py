@@ -0,0 +1,203 @@
+"""
+Long lived AI process. The GUI starts one SearchWorker and sends it searches instead of starting a new process for
+every AI move, so the process start up is paid once and the transposition table and history stay warm between moves.
+Commands go to the worker over a request queue, results come back over a result queue tagged with the id of the
+search they answer, so a result of a search that was stopped or replaced is thrown away.
+A search is stopped cooperatively: the worker process polls a shared stop id between nodes and ends the search on
+its own, the process is never killed in the middle of a search.
+Pondering: every result comes with the reply the search expects, taken from its principal variation. While the
+opponent thinks the worker searches the position after that reply. If the opponent plays it (a ponder hit) the
+ponder search simply goes on as the real search and from then on keeps to the normal budget, otherwise (a miss)
+it is stopped and the real position is searched with the transposition table the ponder search filled.
+"""
+import atexit
+import queue
+import time
+from multiprocessing import Process, Queue, Value
+import SmartMoveFinder
+from ChessEngine import GameState, PositionSnapshot, Move, MOVE_ID_MASK
+
+#commands of the request queue
+START_SEARCH = "start"
+PONDER = "ponder"
+QUIT = "quit"
+
+PONDER_DEPTH = SmartMoveFinder.MAX_PLY // 2 #deep enough that only stop or a ponder hit ends a ponder search
+
+
+class SearchWorker():
+    def __init__(self):
+        self.requests = Queue()
+        self.results = Queue()
+        self.stopID = Value('i', 0, lock=False) #searches with an id up to this one must stop
+        self.ponderHitID = Value('i', 0, lock=False) #ponder search that turned into the real search
+        self.ponderHitTime = Value('d', 0.0, lock=False) #time.time() of the ponder hit, the time limit counts from it
+        self.searchID = 0 #id of the last search sent to the worker
+        self.pondering = False
+        self.bestMove = None
+        self.ponderMove = None #reply the last search expects
+        self.predictedMove = None #reply the running ponder search assumes
+        self.stats = None #SearchStats of the last search
+        self.resultReady = False
+        #not a daemon so it can run the processes of the parallel root search, atexit makes sure it is shut down
+        self.process = Process(target=worker_loop, args=(self.requests, self.results, self.stopID, self.ponderHitID,
+                                                          self.ponderHitTime))
+        self.process.start()
+        atexit.register(self.close)
+
+    '''
+    Starts searching the position of a GameState or PositionSnapshot, returns the id of the search.
+    A search that is still running is stopped first.
+    '''
+    def start_search(self, gs, maxDepth=None, timeLimit=None, nodeLimit=None):
+        return self.send(START_SEARCH, gs, maxDepth, timeLimit, nodeLimit)
+
+    '''
+    Starts pondering: gs is the position after the move of the last search, with the opponent to move, and the
+    position after the reply that search expects is searched without a budget until ponder_hit or stop.
+    maxDepth, timeLimit and nodeLimit are the budget of the search after a ponder hit, as for start_search.
+    Returns the id of the search, or None if no reply was expected and nothing is searched.
+    '''
+    def ponder(self, gs, maxDepth=None, timeLimit=None, nodeLimit=None):
+        if self.ponderMove is None:
+            return None
+        ponderGs = GameState.from_snapshot(gs if isinstance(gs, PositionSnapshot) else gs.snapshot())
+        reply = next((move for move in ponderGs.get_valid_moves() if move == self.ponderMove), None)
+        if reply is None:
+            return None
+        ponderGs.make_move(reply)
+        searchID = self.send(PONDER, ponderGs, maxDepth, timeLimit, nodeLimit)
+        self.predictedMove = Move.from_code(reply)
+        return searchID
+
+    '''
+    Tells the worker the opponent played move while it was pondering. On a ponder hit the ponder search goes on as
+    the search of the real position and True is returned, its move then comes from search_done or wait_for_move
+    as usual. On a miss the ponder search is stopped and False is returned, the caller starts the real search.
+    '''
+    def ponder_hit(self, move):
+        if not self.pondering:
+            return False
+        if move != self.predictedMove:
+            self.stop()
+            return False
+        self.ponderHitTime.value = time.time()
+        self.ponderHitID.value = self.searchID
+        self.pondering = False
+        return True
+
+    def send(self, command, gs, maxDepth, timeLimit, nodeLimit):
+        self.stop()
+        self.searchID += 1
+        self.pondering = command == PONDER
+        self.bestMove = None
+        self.ponderMove = None
+        self.predictedMove = None
+        self.stats = None
+        self.resultReady = False
+        snapshot = gs if not isinstance(gs, GameState) else gs.snapshot()
+        self.requests.put((command, self.searchID, snapshot, maxDepth, timeLimit, nodeLimit))
+        return self.searchID
+
+    '''
+    Asks the running search to stop, its result is thrown away
+    '''
+    def stop(self):
+        self.stopID.value = self.searchID
+        self.pondering = False
+
+    '''
+    True once the result of the last search arrived, the move is then in self.bestMove
+    (None if the search was stopped before it found one) and its SearchStats in self.stats.
+    The result of a ponder search is held back until the ponder hit.
+    '''
+    def search_done(self):
+        while not self.resultReady:
+            try:
+                result = self.results.get_nowait()
+            except queue.Empty:
+                return False
+            self.receive(result)
+        return not self.pondering
+
+    '''
+    Blocks until the result of the last search arrives and returns the move, not to be called while pondering
+    '''
+    def wait_for_move(self):
+        while not self.resultReady:
+            self.receive(self.results.get())
+        return self.bestMove
+
+    def receive(self, result):
+        searchID, move, stats, ponderMove = result
+        if searchID == self.searchID and self.stopID.value < searchID:
+            self.bestMove = move
+            self.stats = stats
+            self.ponderMove = ponderMove
+            self.resultReady = True
+
+    def close(self):
+        if not self.process.is_alive():
+            return
+        self.stop()
+        self.requests.put((QUIT,))
+        self.process.join(timeout=1)
+        if self.process.is_alive():
+            self.process.terminate()
+
+
+"""
+Main loop of the worker process: runs the searches it is sent one after the other and posts every result as
+(search id, move, SearchStats, expected reply)
+"""
+def worker_loop(requests, results, stopID, ponderHitID, ponderHitTime):
+    currentSearch = [0] #id of the search that is running, read by the stop signal
+    ponderBudget = [None, None, None] #maxDepth, timeLimit and nodeLimit of the ponder search after a ponder hit
+
+    def stop_signal():
+        if stopID.value >= currentSearch[0]:
+            return True
+        if ponderHitID.value != currentSearch[0]: #a normal search, or a ponder search that is still pondering
+            return False
+        maxDepth, timeLimit, nodeLimit = ponderBudget
+        return SmartMoveFinder.searchDepth > maxDepth or \
+               (timeLimit is not None and time.time() >= ponderHitTime.value + timeLimit) or \
+               (nodeLimit is not None and SmartMoveFinder.nodeCount >= nodeLimit)
+
+    SmartMoveFinder.stopSignal = stop_signal
+    moveQueue = queue.SimpleQueue() #find_best_move puts its move and stats here
+    while True:
+        request = requests.get()
+        if request[0] == QUIT:
+            SmartMoveFinder.close_root_search_pool()
+            break
+        command, searchID, snapshot, maxDepth, timeLimit, nodeLimit = request
+        if stopID.value >= searchID: #stopped before it started
+            results.put((searchID, None, None, None))
+            continue
+        currentSearch[0] = searchID
+        if command == PONDER:
+            ponderBudget[:] = [SmartMoveFinder.DEPTH if maxDepth is None else maxDepth,
+                               SmartMoveFinder.TIME_LIMIT if timeLimit is None else timeLimit,
+                               SmartMoveFinder.NODE_LIMIT if nodeLimit is None else nodeLimit]
+            maxDepth, timeLimit, nodeLimit = PONDER_DEPTH, None, None
+        SmartMoveFinder.find_best_move(snapshot, None, moveQueue, maxDepth, timeLimit, nodeLimit, returnStats=True)
+        move, stats = moveQueue.get()
+        results.put((searchID, move, stats, expected_reply(snapshot, move)))
+
+"""
+The reply to move the search expects: the second move of its principal variation, or the best move the
+transposition table has for the position after move when the move didn't come from a search. None if neither is legal.
+"""
+def expected_reply(snapshot, move):
+    if move is None:
+        return None
+    gs = GameState.from_snapshot(snapshot)
+    gs.make_move(move)
+    replies = gs.get_valid_moves()
+    principalVariation = SmartMoveFinder.principalVariation
+    if len(principalVariation) >= 2 and principalVariation[0] == move and principalVariation[1] in replies:
+        return Move.from_code(principalVariation[1])
+    moveID = SmartMoveFinder.transpositionTable.get_best_move_id(gs.zobristKey)
+    reply = next((reply for reply in replies if reply & MOVE_ID_MASK == moveID), None)
+    return Move.from_code(reply) if reply is not None else None
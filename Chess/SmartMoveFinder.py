@@ -1,6 +1,17 @@
+import logging
 import random
+import time
+from multiprocessing import Pool, RawArray, RawValue
+import BatchEvaluator
+import OpeningBook
+import Tablebase
+from SearchStats import SearchStats
+from TranspositionTable import TranspositionTable, EXACT, LOWER_BOUND, UPPER_BOUND
+from PieceSquareTables import MAX_PHASE
+from ChessEngine import GameState, PositionSnapshot, Move, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, TYPE_MASK, WHITE, BLACK
+from ChessEngine import END_SHIFT, MOVED_SHIFT, CAPTURED_SHIFT, MOVE_ID_MASK, PROMOTION_MASK, CAPTURED_MASK, PIECE_TO_MASK
 
-pieceScore = {"K": 0, "Q":10, "R": 5, "B":3, "N": 3, "p":1}
+pieceScore = {KING: 0, QUEEN: 10, ROOK: 5, BISHOP: 3, KNIGHT: 3, PAWN: 1}
 
 knightScores = [[1, 1, 1, 1, 1, 1, 1, 1],
                 [1, 2, 2, 2, 2, 2, 2, 1],
@@ -11,9 +22,76 @@ knightScores = [[1, 1, 1, 1, 1, 1, 1, 1],
                 [1, 2, 2, 2, 2, 2, 2, 1],
                 [1, 1, 1, 1, 1, 1, 1, 1]]
                
-piecePositionScores = {"N": knightScores}
-CHECKMATE = 1000
-DEPTH = 3
+piecePositionScores = {KNIGHT: knightScores}
+CHECKMATE = 1000 #the search scores a mate as CHECKMATE less the plies from the root to it
+MATE_THRESHOLD = CHECKMATE - 200 #scores at least this big are mates, evaluations stay far below it
+DEPTH = 3 #deepest iteration of the iterative deepening search
+TIME_LIMIT = None #seconds per move, None to always search up to DEPTH
+NODE_LIMIT = None #nodes per move, None for no limit
+TT_SIZE_MB = 32 #memory cap of the transposition table
+MOVE_ORDERING = True #order moves by hash move, MVV-LVA captures, killer moves and history before searching them
+MAX_PLY = 64
+QUIESCENCE = True #resolve captures at the horizon instead of scoring the board in the middle of an exchange
+DELTA_MARGIN = 2 #captures that can't bring the score within this many points of alpha are skipped
+NULL_MOVE_PRUNING = True #pass the turn and search shallower, if that still fails high the node is cut off
+NULL_MOVE_REDUCTION = 2 #how much shallower the null move is searched
+LATE_MOVE_REDUCTIONS = True #search quiet moves late in the move order one ply shallower, again if they beat alpha
+LMR_MIN_DEPTH = 3 #shallowest depth at which moves are reduced
+LMR_FULL_DEPTH_MOVES = 4 #moves searched to full depth before reducing
+CHECK_EXTENSIONS = True #search moves that give check one ply deeper
+NULL_WINDOW = 0.01 #width of the zero window searches, much less than any score difference that matters
+PRINCIPAL_VARIATION_SEARCH = True #search every move after the first with a zero window, again if it beats alpha
+ASPIRATION_WINDOW = 0.5 #half width of the window around the previous iteration's score, None for full windows
+ASPIRATION_MIN_DEPTH = 3 #first iteration that is searched with an aspiration window
+PARALLEL_WORKERS = 1 #processes the root moves are split over, 1 searches in this process
+EVALUATOR = "pst" #name in evaluators of the function that scores the board, see set_evaluator
+BOOK_FILE = "book.bin" #opening book played before searching, see OpeningBook, None for no book
+LOG_STATS = False #log the SearchStats of every search at INFO level on the "SmartMoveFinder" logger
+TABLEBASE_DIR = Tablebase.DEFAULT_DIRECTORY #folder of the endgame tablebases, see Tablebase, None for no tablebases
+TABLEBASE_MAX_PHASE = 4 #only positions with at most this much game phase (a queen) can be in the tablebases
+LEAF_BATCHING = False #score all the leaves below a depth 1 node in one NumPy batch, needs QUIESCENCE off and "pst"
+
+transpositionTable = TranspositionTable(TT_SIZE_MB)
+logger = logging.getLogger("SmartMoveFinder")
+openingBook = None #OpeningBook of BOOK_FILE, opened on first use
+openingBookPath = None
+tablebases = None #Tablebases of TABLEBASE_DIR, opened on first use, None if it has no tables
+tablebasesPath = None
+rootSearchPool = None #processes of the parallel root search, started on first use
+rootSearchPoolSize = 0
+rootSearchStop = None #shared flag the processes of the parallel root search stop on
+rootSearchDepths = None #shared depth of the last iteration every process of the parallel root search completed
+rootSearchNodes = None #shared node count of every process of the parallel root search at its last completed iteration
+ROOT_SEARCH_POLL_INTERVAL = 0.01 #seconds between two checks of stopSignal while the parallel root search runs
+
+#state of the running search, set up by find_best_move
+nextMove = None
+searchDepth = DEPTH #depth of the current iteration
+rootPly = 0 #length of the move log at the root, the ply of a node is how many moves were made since
+partialRoot = False #only some of the root moves are searched, so the root score doesn't go in the transposition table
+nodeCount = 0
+stopTime = None
+maxNodes = None
+stopSignal = None #function returning True when the search must stop early, set by SearchWorker
+STOP_CHECK_INTERVAL = 1024 #nodes between two calls of stopSignal
+infoCallback = None #function(depth, score, nodes, principal variation) called after every completed iteration
+principalVariation = [] #best line found by the previous iteration, packed moves
+pvTable = [[] for ply in range(MAX_PLY + 1)] #best line found below the node at every ply of the current search
+batchLeaves = False #LEAF_BATCHING is on and can be used by this search
+followPV = False #True while the search is still walking down principalVariation
+betaCutoffs = 0
+firstMoveCutoffs = 0 #beta cutoffs caused by the first move searched, the higher the better the ordering
+leafEvaluations = 0
+tablebaseHits = 0
+lastSearchStats = SearchStats() #counters of the last finished search
+killerMoves = [[None, None] for ply in range(MAX_PLY)] #ids of two quiet moves per ply that caused a beta cutoff
+historyTable = {} #move >> END_SHIFT & PIECE_TO_MASK (pieceMoved, endSq) -> beta cutoffs of quiet moves, weighted by depth
+
+#move ordering scores, every group is tried before the next one
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+FIRST_KILLER_SCORE = 90000
+SECOND_KILLER_SCORE = 80000
 
 
 """
@@ -47,7 +125,7 @@ def find_best_move_dummy(gs, validMoves):
             elif gs.staleMate:
                 score = 0
             else:
-                score = -turnMultiplier * score_material(gs.board)
+                score = -turnMultiplier * score_material(gs)
             if score > opponentMaxScore:
                 opponentMaxScore = score
             gs.undo_move()
@@ -58,15 +136,339 @@ def find_best_move_dummy(gs, validMoves):
     return bestPlayerMove
 
 """
-Helper method to make first recursive call
+Raised inside the search when the time or node budget of the move is used up or the search is stopped
 """
-def find_best_move(gs, validMoves, returnQueue):
-    global nextMove
-    nextMove = None
+class SearchTimeout(Exception):
+    pass
+
+"""
+True when the time or node budget of the move is used up or the search was asked to stop
+"""
+def out_of_budget():
+    return (stopTime is not None and time.time() >= stopTime) or (maxNodes is not None and nodeCount >= maxNodes) or \
+           (stopSignal is not None and nodeCount % STOP_CHECK_INTERVAL == 0 and stopSignal())
+
+"""
+Helper method to make first recursive call. Searches with iterative deepening up to maxDepth, stopping
+early when timeLimit seconds or nodeLimit nodes are used up, and puts the best move of the last
+completed iteration on returnQueue as a Move, or (Move, SearchStats of the search) with returnStats.
+validMoves are packed moves as GameState.get_valid_moves returns them.
+gs can also be a ChessEngine.PositionSnapshot, the position is then rebuilt here and validMoves can be None.
+With more than one worker (PARALLEL_WORKERS by default) the root moves are split over that many processes.
+"""
+def find_best_move(gs, validMoves, returnQueue, maxDepth=None, timeLimit=None, nodeLimit=None, workers=None, returnStats=False):
+    if isinstance(gs, PositionSnapshot):
+        gs = GameState.from_snapshot(gs)
+    if validMoves is None:
+        validMoves = gs.get_valid_moves()
+    bookMove = find_book_move(gs, validMoves)
+    if bookMove is not None:
+        returnQueue.put((bookMove, SearchStats()) if returnStats else bookMove)
+        return
+    tablebaseMove = find_tablebase_move(gs, validMoves)
+    if tablebaseMove is not None:
+        tablebaseMove = Move.from_code(tablebaseMove)
+        returnQueue.put((tablebaseMove, SearchStats()) if returnStats else tablebaseMove)
+        return
     random.shuffle(validMoves)
-    #ind_move_min_max(gs, validMoves, DEPTH, gs.whiteToMove)
-    find_move_nega_max_alpha_beta(gs, validMoves, DEPTH, 1 if gs.whiteToMove else -1, -CHECKMATE, CHECKMATE)
-    returnQueue.put(nextMove)
+    workers = PARALLEL_WORKERS if workers is None else workers
+    if workers > 1 and len(validMoves) > 1:
+        bestMove, bestScore, pv = parallel_root_search(gs, validMoves, workers, maxDepth, timeLimit, nodeLimit)
+    else:
+        bestMove, bestScore, pv = iterative_deepening(gs, validMoves, maxDepth, timeLimit, nodeLimit)
+    returnQueue.put((bestMove, lastSearchStats) if returnStats else bestMove)
+
+"""
+Returns a move of the opening book for the position, or None when it isn't in the book or there is no book
+"""
+def find_book_move(gs, validMoves):
+    global openingBook, openingBookPath
+    if BOOK_FILE != openingBookPath: #first use, or BOOK_FILE was changed
+        if openingBook is not None:
+            openingBook.close()
+        openingBook = OpeningBook.open_book(BOOK_FILE)
+        openingBookPath = BOOK_FILE
+    if openingBook is None:
+        return None
+    return openingBook.choose_move(gs, validMoves)
+
+"""
+Opens the tablebases of TABLEBASE_DIR the first time they are needed or after TABLEBASE_DIR was changed
+"""
+def open_tablebases():
+    global tablebases, tablebasesPath
+    if TABLEBASE_DIR != tablebasesPath:
+        if tablebases is not None:
+            tablebases.close()
+        tablebases = Tablebase.Tablebases(TABLEBASE_DIR) if TABLEBASE_DIR is not None else None
+        if tablebases is not None and not tablebases.tables:
+            tablebases = None
+        tablebasesPath = TABLEBASE_DIR
+    return tablebases
+
+"""
+Score of a tablebase result for the side to move of a position ply plies from the root, the same as the search
+gives the mate the tablebase knows about: CHECKMATE less the plies from the root to it
+"""
+def tablebase_score(result, plies, ply=0):
+    if result == Tablebase.DRAW_RESULT:
+        return 0
+    return result * (CHECKMATE - ply - plies)
+
+"""
+Returns the move the tablebases say is best at the root: the fastest mate if the position is won, a drawing move
+if it is drawn and the slowest mate for the opponent if it is lost. None if the position isn't in the tablebases.
+"""
+def find_tablebase_move(gs, validMoves):
+    if open_tablebases() is None or gs.gamePhase > TABLEBASE_MAX_PHASE or not validMoves:
+        return None
+    bestMove = None
+    bestScore = -CHECKMATE
+    for move in validMoves:
+        gs.make_move(move)
+        probe = tablebases.probe(gs)
+        gs.undo_move()
+        if probe is None:
+            return None
+        score = -tablebase_score(*probe, 1)
+        if score > bestScore:
+            bestScore = score
+            bestMove = move
+    return bestMove
+
+"""
+Searches the given root moves with iterative deepening, returns the best move of the last completed iteration,
+its score for the side to move and its principal variation, as Moves. The principal variation also stays in
+principalVariation, as packed moves.
+From ASPIRATION_MIN_DEPTH on an iteration starts with a window of ASPIRATION_WINDOW around the score of the previous
+one, and if the score falls outside it the window is widened on that side, 4 times as much each time, and the
+iteration searched again. The counters of the search are left in lastSearchStats.
+"""
+def iterative_deepening(gs, validMoves, maxDepth=None, timeLimit=None, nodeLimit=None):
+    global nextMove, searchDepth, nodeCount, stopTime, maxNodes, principalVariation, betaCutoffs, firstMoveCutoffs, killerMoves
+    global batchLeaves, leafEvaluations, tablebaseHits, lastSearchStats, rootPly
+    stats = SearchStats()
+    open_tablebases()
+    startTime = iterationStartTime = time.perf_counter()
+    transpositionTable.reset_counters()
+    batchLeaves = LEAF_BATCHING and not QUIESCENCE and evaluate is score_piece_squares and BatchEvaluator.available()
+    maxDepth = DEPTH if maxDepth is None else maxDepth
+    timeLimit = TIME_LIMIT if timeLimit is None else timeLimit
+    maxNodes = NODE_LIMIT if nodeLimit is None else nodeLimit
+    stopTime = time.time() + timeLimit if timeLimit is not None else None
+    nodeCount = betaCutoffs = firstMoveCutoffs = leafEvaluations = tablebaseHits = 0
+    nextMove = None
+    principalVariation = []
+    for line in pvTable: #lines of an earlier search or position must not end up in this one's
+        line.clear()
+    killerMoves = [[None, None] for ply in range(MAX_PLY)]
+    for key in historyTable: #age the history of the previous move
+        historyTable[key] //= 8
+    bestMove = None
+    bestScore = -CHECKMATE
+    rootPly = len(gs.moveLog)
+    for searchDepth in range(1, maxDepth + 1):
+        if ASPIRATION_WINDOW is not None and searchDepth >= ASPIRATION_MIN_DEPTH and abs(bestScore) < CHECKMATE // 2:
+            delta = ASPIRATION_WINDOW
+            alpha, beta = bestScore - delta, bestScore + delta
+        else:
+            delta = None
+            alpha, beta = -CHECKMATE, CHECKMATE
+        try:
+            while True:
+                nextMove = None
+                score = find_move_nega_max_alpha_beta(gs, validMoves, searchDepth, 1 if gs.whiteToMove else -1, alpha, beta)
+                if delta is None or alpha < score < beta:
+                    break
+                delta *= 4
+                if score <= alpha: #fail low, the previous best move got worse
+                    alpha = max(score - delta, -CHECKMATE)
+                else: #fail high
+                    beta = min(score + delta, CHECKMATE)
+                if delta > CHECKMATE: #search the last time with the full window
+                    alpha, beta, delta = -CHECKMATE, CHECKMATE, None
+        except SearchTimeout:
+            while len(gs.moveLog) > rootPly: #unwind the moves the interrupted search left on the board
+                gs.undo_move()
+            if bestMove is None: #not even the first iteration finished, use what it found so far
+                bestMove = nextMove
+            break
+        bestMove = nextMove
+        bestScore = score
+        now = time.perf_counter()
+        stats.add_iteration(searchDepth, nodeCount - stats.nodes, now - iterationStartTime, score)
+        stats.nodes = nodeCount
+        iterationStartTime = now
+        principalVariation = get_principal_variation(gs, pvTable[0], searchDepth)
+        if infoCallback is not None:
+            infoCallback(searchDepth, score, nodeCount, [Move.from_code(move) for move in principalVariation])
+        if abs(score) >= MATE_THRESHOLD and CHECKMATE - abs(score) <= searchDepth: #a forced mate within the depth
+            break
+    stats.nodes = nodeCount
+    stats.leafEvaluations = leafEvaluations
+    stats.betaCutoffs = betaCutoffs
+    stats.firstMoveCutoffs = firstMoveCutoffs
+    stats.ttHits = transpositionTable.hits
+    stats.ttProbes = transpositionTable.hits + transpositionTable.misses
+    stats.tablebaseHits = tablebaseHits
+    stats.seconds = time.perf_counter() - startTime
+    lastSearchStats = stats
+    if LOG_STATS:
+        logger.info("search %s", stats)
+    if not principalVariation or principalVariation[0] != bestMove: #the first iteration didn't finish
+        principalVariation = [bestMove] if bestMove is not None else []
+    return to_move(bestMove), bestScore, [Move.from_code(move) for move in principalVariation]
+
+"""
+The Move of a packed move the search returns, None stays None
+"""
+def to_move(move):
+    return Move.from_code(move) if move is not None else None
+
+"""
+Splits the root moves over workers processes that each search their share with iterative_deepening and a full
+window (after aspiration windows the root score is exact), so the best of their results is the move, score and
+principal variation a search of all the moves in one process finds.
+The moves are dealt out in move ordering order so every process gets some of the promising ones.
+The processes can finish at different depths (under a time limit, or after finding a mate), their results are
+compared at the deepest iteration all of them completed.
+timeLimit applies to the whole search, nodeLimit to every process. nodeCount and lastSearchStats are set to the
+sums of all the processes. While the processes search, stopSignal is checked here and passed on to them, and
+searchDepth and nodeCount follow the iteration they are all in and the nodes of the iterations they completed.
+"""
+def parallel_root_search(gs, validMoves, workers, maxDepth=None, timeLimit=None, nodeLimit=None):
+    global nodeCount, lastSearchStats, principalVariation, searchDepth
+    startTime = time.perf_counter()
+    pool = get_root_search_pool(workers)
+    snapshot = gs.snapshot()
+    orderedMoves = order_moves(validMoves, transpositionTable.get_best_move_id(gs.zobristKey), 0)
+    shares = [[move & MOVE_ID_MASK for move in orderedMoves[i::workers]] for i in range(min(workers, len(orderedMoves)))]
+    rootSearchStop.value = False
+    for i in range(len(shares)):
+        rootSearchDepths[i] = rootSearchNodes[i] = 0
+    searchDepth = 1
+    nodeCount = 0
+    asyncResults = pool.starmap_async(search_root_moves, [(snapshot, share, i, maxDepth, timeLimit, nodeLimit)
+                                                          for i, share in enumerate(shares)])
+    while not asyncResults.ready():
+        asyncResults.wait(ROOT_SEARCH_POLL_INTERVAL)
+        searchDepth = min(rootSearchDepths[:len(shares)]) + 1
+        nodeCount = sum(rootSearchNodes[:len(shares)])
+        if stopSignal is not None and stopSignal():
+            rootSearchStop.value = True
+    results = asyncResults.get()
+    commonDepth = min(len(iterations) for iterations, score, moveID, processStats, pv in results)
+    stats = SearchStats()
+    bestScore = -CHECKMATE - 1
+    bestMoveID = None
+    principalVariation = []
+    for iterations, score, moveID, processStats, pv in results:
+        stats.merge(processStats)
+        if commonDepth > 0: #the result of the common iteration instead of the last one
+            score, moveID, pv = iterations[commonDepth - 1]
+        if moveID is not None and score > bestScore:
+            bestScore = score
+            bestMoveID = moveID
+            principalVariation = pv #packed moves like the one of iterative_deepening
+    stats.processes = len(results)
+    if commonDepth > 0:
+        stats.depth = commonDepth
+    stats.seconds = time.perf_counter() - startTime
+    nodeCount = stats.nodes
+    searchDepth = commonDepth
+    lastSearchStats = stats
+    if LOG_STATS:
+        logger.info("parallel search %s", stats)
+    bestMove = next((move for move in validMoves if move & MOVE_ID_MASK == bestMoveID), None)
+    return to_move(bestMove), bestScore, [Move.from_code(move) for move in principalVariation]
+
+"""
+Task run by the processes of the parallel root search: searches the root moves with the given ids, shareIndex is
+the slot of the process in rootSearchDepths and rootSearchNodes. Returns (the (score, move id, principal variation) of every completed
+iteration, score, move id, SearchStats of the search, principal variation), the principal variations as packed moves.
+The root score of a share isn't the score of the position, so it isn't stored in the transposition table.
+"""
+def search_root_moves(snapshot, moveIDs, shareIndex, maxDepth, timeLimit, nodeLimit):
+    global infoCallback, partialRoot
+    gs = GameState.from_snapshot(snapshot)
+    rootMoves = [move for move in gs.get_valid_moves() if move & MOVE_ID_MASK in moveIDs]
+    iterations = []
+    def record_iteration(depth, score, nodes, pv):
+        iterations.append((score, nextMove & MOVE_ID_MASK, [move.code for move in pv]))
+        rootSearchDepths[shareIndex] = depth
+        rootSearchNodes[shareIndex] = nodes
+    infoCallback = record_iteration
+    partialRoot = True
+    try:
+        bestMove, bestScore, pv = iterative_deepening(gs, rootMoves, maxDepth, timeLimit, nodeLimit)
+    finally:
+        infoCallback = None
+        partialRoot = False
+    return iterations, bestScore, bestMove.moveID if bestMove is not None else None, lastSearchStats, [move.code for move in pv]
+
+"""
+Returns the pool of the parallel root search, restarting it if it has a different number of processes
+"""
+def get_root_search_pool(workers):
+    global rootSearchPool, rootSearchPoolSize, rootSearchStop, rootSearchDepths, rootSearchNodes
+    if rootSearchPool is None or rootSearchPoolSize != workers:
+        close_root_search_pool()
+        rootSearchStop = RawValue('b', False)
+        rootSearchDepths = RawArray('i', workers)
+        rootSearchNodes = RawArray('q', workers)
+        rootSearchPool = Pool(workers, initializer=init_root_search_process,
+                              initargs=(rootSearchStop, rootSearchDepths, rootSearchNodes))
+        rootSearchPoolSize = workers
+    return rootSearchPool
+
+"""
+Runs once in every process of the parallel root search. The searches there stop on rootSearchStop, which
+parallel_root_search sets, never on the stopSignal a forked process inherits from the process that started the pool.
+"""
+def init_root_search_process(stopFlag, depths, nodes):
+    global stopSignal, infoCallback, rootSearchStop, rootSearchDepths, rootSearchNodes
+    rootSearchStop = stopFlag
+    rootSearchDepths = depths
+    rootSearchNodes = nodes
+    stopSignal = root_search_stopped
+    infoCallback = None
+
+def root_search_stopped():
+    return bool(rootSearchStop.value)
+
+def close_root_search_pool():
+    global rootSearchPool, rootSearchPoolSize
+    if rootSearchPool is not None:
+        rootSearchPool.terminate()
+        rootSearchPool.join()
+    rootSearchPool = None
+    rootSearchPoolSize = 0
+
+"""
+The line pv the search found, continued with the best moves stored in the transposition table up to maxLength moves
+where it was cut short by a transposition table or tablebase hit. Every move is checked against the legal moves
+before it is played, the line ends at the first one that isn't legal.
+"""
+def get_principal_variation(gs, pv, maxLength):
+    legalPV = []
+    for move in pv:
+        if move not in gs.get_valid_moves():
+            break
+        gs.make_move(move)
+        legalPV.append(move)
+    pv = legalPV
+    for i in range(len(pv), maxLength):
+        moveID = transpositionTable.get_best_move_id(gs.zobristKey)
+        if moveID is None:
+            break
+        move = next((m for m in gs.get_valid_moves() if m & MOVE_ID_MASK == moveID), None)
+        if move is None:
+            break
+        gs.make_move(move)
+        pv.append(move)
+    for move in pv:
+        gs.undo_move()
+    return pv
 
 """
 MiniMax algotithm with recursion
@@ -74,7 +476,7 @@ MiniMax algotithm with recursion
 def find_move_min_max(gs, validMoves, depth, whiteToMove):
     global nextMove 
     if depth == 0:
-        return score_material(gs.board)
+        return score_material(gs)
 
     if whiteToMove:
         maxScore = -CHECKMATE
@@ -123,34 +525,272 @@ def find_move_nega_max(gs, validMoves, depth, turnMultiplier):
     return maxScore
 
 """
-Nega max with Alpha-Beta-Pruning
+Nega max with Alpha-Beta-Pruning, positions already searched deep enough are taken from the transposition table.
+Positions in the endgame tablebases are scored from them without searching further.
+The principal variation of the previous iteration is searched first. With PRINCIPAL_VARIATION_SEARCH only the
+first move gets the full window, the others are searched with a zero window that just shows they are worse, and
+again with the full window if they aren't. The best line below the node is left in pvTable[ply].
+Selective search, each part behind its flag: null move pruning (not twice in a row, not in check and not when the
+side to move has only pawns left, where zugzwang makes passing better than any move), late move reductions of quiet
+moves and check extensions. Because of them depth isn't the distance to the root, the ply is counted from the
+move log instead.
 """
-def find_move_nega_max_alpha_beta(gs, validMoves, depth, turnMultiplier, alpha, beta):
-    global nextMove
-    if depth == 0:
-        return turnMultiplier * score_board(gs)
+def find_move_nega_max_alpha_beta(gs, validMoves, depth, turnMultiplier, alpha, beta, nullMoveAllowed=True):
+    global nextMove, nodeCount, followPV, betaCutoffs, firstMoveCutoffs, tablebaseHits
+    nodeCount += 1
+    if out_of_budget():
+        raise SearchTimeout()
+    ply = len(gs.moveLog) - rootPly
+    if ply == 0:
+        followPV = True
+    if ply < MAX_PLY:
+        pvTable[ply] = []
+    if depth <= 0:
+        if QUIESCENCE:
+            #validMoves is complete here, only captures (or all the moves out of check) are searched further
+            captureMoves = validMoves if gs.inCheck else [move for move in validMoves if is_tactical(move)]
+            return quiescence_search(gs, captureMoves, turnMultiplier, alpha, beta)
+        score = turnMultiplier * score_board(gs)
+        return score + ply if gs.checkMate else score
+    if not validMoves: #the caller generated validMoves, so checkMate is up to date
+        return ply - CHECKMATE if gs.checkMate else 0
+    if tablebases is not None and gs.gamePhase <= TABLEBASE_MAX_PHASE and ply != 0:
+        probe = tablebases.probe(gs)
+        if probe is not None:
+            tablebaseHits += 1
+            return tablebase_score(*probe, ply)
 
-    #move ordering - implement later
-    maxScore = -CHECKMATE
-    for move in validMoves:
-        gs.make_move(move)
+    alphaOrig = alpha
+    entry = transpositionTable.probe(gs.zobristKey)
+    if entry is not None and entry[1] >= depth and ply != 0: #the root always has to be searched to set nextMove
+        ttScore = score_from_table(entry[2], ply)
+        if entry[3] == EXACT:
+            return ttScore
+        elif entry[3] == LOWER_BOUND:
+            alpha = max(alpha, ttScore)
+        else:
+            beta = min(beta, ttScore)
+        if alpha >= beta:
+            return ttScore
+
+    #the caller generated validMoves right before this call, so gs.inCheck is up to date except at the root
+    inCheck = gs.inCheck if ply != 0 else gs.check_for_pins_and_checks()[0]
+    if NULL_MOVE_PRUNING and nullMoveAllowed and not followPV and not inCheck and depth > NULL_MOVE_REDUCTION and \
+       abs(beta) < CHECKMATE // 2 and has_pieces(gs):
+        gs.make_null_move()
         nextMoves = gs.get_valid_moves()
-        score = -find_move_nega_max_alpha_beta(gs, nextMoves, depth-1, -turnMultiplier, -beta, -alpha)
-        if score > maxScore:
+        score = -find_move_nega_max_alpha_beta(gs, nextMoves, depth - 1 - NULL_MOVE_REDUCTION, -turnMultiplier,
+                                               -beta, -beta + NULL_WINDOW, False)
+        gs.undo_move()
+        if score >= beta: #even passing is too good for the opponent to allow
+            return beta
+
+    hashMoveID = entry[4] if entry is not None else None
+    if followPV:
+        pvMove = principalVariation[ply] if ply < len(principalVariation) else None
+        if pvMove in validMoves:
+            hashMoveID = pvMove & MOVE_ID_MASK
+        else:
+            followPV = False
+    if MOVE_ORDERING:
+        validMoves = order_moves(validMoves, hashMoveID, ply)
+
+    maxScore = -CHECKMATE
+    bestMove = None
+    leafScores = score_leaves(gs, validMoves, turnMultiplier) if depth == 1 and batchLeaves else None
+    for i, move in enumerate(validMoves):
+        if leafScores is not None:
+            score = leafScores[i]
+            if ply + 1 < MAX_PLY:
+                pvTable[ply + 1] = [] #the leaves have no line below them
+        else:
+            gs.make_move(move)
+            nextMoves = gs.get_valid_moves()
+            givesCheck = gs.inCheck
+            newDepth = depth - 1
+            if CHECK_EXTENSIONS and givesCheck and ply < 2 * searchDepth: #the ply limit stops endless checking lines
+                newDepth += 1
+            fullSearch = i == 0 or not PRINCIPAL_VARIATION_SEARCH
+            if LATE_MOVE_REDUCTIONS and i >= LMR_FULL_DEPTH_MOVES and depth >= LMR_MIN_DEPTH and not inCheck and \
+               not givesCheck and not is_tactical(move):
+                score = -find_move_nega_max_alpha_beta(gs, nextMoves, newDepth - 1, -turnMultiplier, -alpha - NULL_WINDOW, -alpha)
+                fullSearch = score > alpha #the reduced search says the move is better than expected, search it properly
+            elif not fullSearch:
+                score = -find_move_nega_max_alpha_beta(gs, nextMoves, newDepth, -turnMultiplier, -alpha - NULL_WINDOW, -alpha)
+                fullSearch = alpha < score < beta #only a fail high inside the window needs the exact score
+            if fullSearch:
+                score = -find_move_nega_max_alpha_beta(gs, nextMoves, newDepth, -turnMultiplier, -beta, -alpha)
+            gs.undo_move()
+        followPV = False #only the first move of a node can continue the principal variation
+        if score > maxScore or bestMove is None: #even a lost node has a best move, the root needs one
             maxScore = score
-            if depth == DEPTH:
+            bestMove = move
+            if ply == 0:
                 nextMove = move
-        gs.undo_move()
         if maxScore > alpha: #pruning happens
             alpha = maxScore
+            if ply < MAX_PLY:
+                pvTable[ply] = [move] + pvTable[ply + 1] if ply + 1 < MAX_PLY else [move]
+        if alpha >= beta:
+            betaCutoffs += 1
+            if i == 0:
+                firstMoveCutoffs += 1
+            if not move & CAPTURED_MASK:
+                store_killer_and_history(move, depth, ply)
+            break
+
+    if maxScore <= alphaOrig:
+        bound = UPPER_BOUND
+    elif maxScore >= beta:
+        bound = LOWER_BOUND
+    else:
+        bound = EXACT
+    if ply != 0 or not partialRoot:
+        transpositionTable.store(gs.zobristKey, depth, score_to_table(maxScore, ply), bound, bestMove & MOVE_ID_MASK if bestMove is not None else None)
+    return maxScore
+
+"""
+Mate scores count the plies from the root, in the transposition table they count the plies from the position
+instead, so an entry is right wherever in the tree the position comes up again
+"""
+def score_to_table(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score + ply
+    if score <= -MATE_THRESHOLD:
+        return score - ply
+    return score
+
+def score_from_table(score, ply):
+    if score >= MATE_THRESHOLD:
+        return score - ply
+    if score <= -MATE_THRESHOLD:
+        return score + ply
+    return score
+
+"""
+True if the side to move has a piece other than pawns and the king, null move pruning is only safe then
+"""
+def has_pieces(gs):
+    bitboards = gs.bitboards
+    color = WHITE if gs.whiteToMove else BLACK
+    return bool(bitboards[color | KNIGHT] | bitboards[color | BISHOP] | bitboards[color | ROOK] | bitboards[color | QUEEN])
+
+"""
+Leaf batching: scores the position after every move with one BatchEvaluator call instead of a depth 0 search per
+move. Returns the scores for the side to move in the order of validMoves. Mates and stalemates are scored here.
+"""
+def score_leaves(gs, validMoves, turnMultiplier):
+    global nodeCount, leafEvaluations
+    scores = [0] * len(validMoves)
+    boards = []
+    boardIndexes = []
+    for i, move in enumerate(validMoves):
+        gs.make_move(move)
+        gs.get_valid_moves()
+        if gs.checkMate or gs.staleMate:
+            scores[i] = turnMultiplier * score_board(gs)
+            if gs.checkMate: #a mate for the side to move, the sooner the better
+                scores[i] -= len(gs.moveLog) - rootPly
+        else:
+            boards.append(gs.board_bytes())
+            boardIndexes.append(i)
+        gs.undo_move()
+    nodeCount += len(validMoves)
+    leafEvaluations += len(boards)
+    if boards:
+        for i, score in zip(boardIndexes, BatchEvaluator.evaluate_boards(boards)):
+            scores[i] = turnMultiplier * float(score)
+    return scores
+
+"""
+Returns the moves sorted so the ones most likely to cause a cutoff come first: the hash move,
+captures by most valuable victim / least valuable attacker, the killer moves of this ply and
+then the other quiet moves by their history score
+"""
+def order_moves(validMoves, hashMoveID, ply):
+    killers = killerMoves[ply] if ply < MAX_PLY else [None, None]
+    def move_order_score(move):
+        moveID = move & MOVE_ID_MASK
+        if moveID == hashMoveID:
+            return HASH_MOVE_SCORE
+        if move & CAPTURED_MASK:
+            return CAPTURE_SCORE + mvv_lva_score(move)
+        if moveID == killers[0]:
+            return FIRST_KILLER_SCORE
+        if moveID == killers[1]:
+            return SECOND_KILLER_SCORE
+        return min(historyTable.get(move >> END_SHIFT & PIECE_TO_MASK, 0), SECOND_KILLER_SCORE - 1)
+    return sorted(validMoves, key=move_order_score, reverse=True)
+
+"""
+Most valuable victim first, least valuable attacker among equal victims
+"""
+def mvv_lva_score(move):
+    return 10 * pieceScore[move >> CAPTURED_SHIFT & TYPE_MASK] - pieceScore[move >> MOVED_SHIFT & TYPE_MASK]
+
+"""
+Captures and pawn moves to the last rank, the moves the quiescence search looks at
+"""
+def is_tactical(move):
+    return move & (CAPTURED_MASK | PROMOTION_MASK) != 0
+
+"""
+Searches only captures and promotions (or every move out of check) until the position is quiet, so the board is
+never scored in the middle of an exchange. The side to move can stand pat on the static score when not in check,
+and captures that can't raise the score to alpha even when winning the piece for free are skipped (delta pruning).
+"""
+def quiescence_search(gs, captureMoves, turnMultiplier, alpha, beta):
+    global nodeCount
+    nodeCount += 1
+    if out_of_budget():
+        raise SearchTimeout()
+    inCheck = gs.inCheck
+    standPat = turnMultiplier * score_board(gs)
+    if gs.checkMate: #mated, the sooner the worse
+        return standPat + len(gs.moveLog) - rootPly
+    if gs.staleMate:
+        return standPat
+    if inCheck:
+        maxScore = -CHECKMATE #standing pat is not an option in check
+    else:
+        if standPat >= beta:
+            return standPat
+        alpha = max(alpha, standPat)
+        maxScore = standPat
+
+    for move in sorted(captureMoves, key=lambda m: mvv_lva_score(m) if m & CAPTURED_MASK else 0, reverse=True):
+        if not inCheck and move & CAPTURED_MASK and not move & PROMOTION_MASK and \
+        standPat + pieceScore[move >> CAPTURED_SHIFT & TYPE_MASK] + DELTA_MARGIN < alpha:
+            continue
+        gs.make_move(move)
+        nextMoves = gs.get_capture_moves()
+        score = -quiescence_search(gs, nextMoves, -turnMultiplier, -beta, -alpha)
+        gs.undo_move()
+        if score > maxScore:
+            maxScore = score
+        if maxScore > alpha:
+            alpha = maxScore
         if alpha >= beta:
             break
     return maxScore
 
+"""
+Remembers a quiet move that caused a beta cutoff as a killer move of its ply and in the history table
+"""
+def store_killer_and_history(move, depth, ply):
+    moveID = move & MOVE_ID_MASK
+    if ply < MAX_PLY and killerMoves[ply][0] != moveID:
+        killerMoves[ply][1] = killerMoves[ply][0]
+        killerMoves[ply][0] = moveID
+    key = move >> END_SHIFT & PIECE_TO_MASK
+    historyTable[key] = historyTable.get(key, 0) + depth * depth
+
 """
 A positive score is good for white, a negative score is good for black
 """
 def score_board(gs):
+    global leafEvaluations
+    leafEvaluations += 1
     if gs.checkMate:
         if gs.whiteToMove:
             return -CHECKMATE #black wins
@@ -158,31 +798,52 @@ def score_board(gs):
             return CHECKMATE #white wins
     elif gs.staleMate:
         return 0 #neither side wins
+    return evaluate(gs)
+
+"""
+Tapered piece-square evaluation in pawns. The middlegame and endgame sums are kept up to date by make_move, so this
+only blends them by the game phase.
+"""
+def score_piece_squares(gs):
+    phase = min(gs.gamePhase, MAX_PHASE) #early promotions can push the phase past the start
+    return (gs.midgameScore * phase + gs.endgameScore * (MAX_PHASE - phase)) / (100 * MAX_PHASE)
 
+"""
+Material plus the knight position scores, the evaluation used before the piece-square tables
+"""
+def score_material_and_knights(gs):
     score = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            square = gs.board[row][col]
-            if square != "--":
-                #score it positionnally 
-                piecePositionScore = 0
-                if square[1] == "N":
-                    piecePositionScore = piecePositionScores["N"][row][col]
-                if square[0] == 'w':
-                    score += pieceScore[square[1]] + piecePositionScore * .2
-                elif square[0] == 'b':
-                    score -= pieceScore[square[1]] + piecePositionScore * .2
+    for pieceType, value in pieceScore.items():
+        #material from the piece counts, each bitboard has one bit set per piece
+        score += value * (gs.bitboards[WHITE | pieceType].bit_count() - gs.bitboards[BLACK | pieceType].bit_count())
+    for pieceType, positionScores in piecePositionScores.items():
+        #score it positionnally
+        for color, sign in ((WHITE, 1), (BLACK, -1)):
+            pieces = gs.bitboards[color | pieceType]
+            while pieces:
+                lowestBit = pieces & -pieces
+                pieces ^= lowestBit
+                sq = lowestBit.bit_length() - 1
+                score += sign * positionScores[sq // 8][sq % 8] * .2
     return score
 
+#board scoring functions score_board can use, picked by name with set_evaluator
+evaluators = {"pst": score_piece_squares, "knights": score_material_and_knights}
+evaluate = evaluators[EVALUATOR]
+
+"""
+Selects the function score_board uses, either the name of one of the evaluators or any function that takes a
+GameState and returns a score that is positive when white is better
+"""
+def set_evaluator(evaluator):
+    global evaluate
+    evaluate = evaluators[evaluator] if isinstance(evaluator, str) else evaluator
+
 
 
-def score_material(board):
+def score_material(gs):
     score = 0
-    for row in board:
-        for square in row:
-            if square[0] == 'w':
-                score += pieceScore[square[1]] 
-            elif square[0] == 'b':
-                score -= pieceScore[square[1]]
+    for pieceType, value in pieceScore.items():
+        score += value * (gs.bitboards[WHITE | pieceType].bit_count() - gs.bitboards[BLACK | pieceType].bit_count())
 
     return score
\ No newline at end of file
@@ -0,0 +1,279 @@
+"""
+Endgame tablebases for a king and a queen, rook or pawn against a lone king (KQK, KRK, KPK).
+A table holds one byte for every placement of the two kings and the piece with either side to move, the strong
+side is white in the files and positions where black has the piece are looked up with the board mirrored.
+Byte values, for the side to move: DRAW (0, also used for impossible placements), 1 to 127 the side to move mates
+in that many plies, LOSS + n (128 + n) the side to move gets mated in n plies, LOSS itself is checkmate.
+The tables are generated by retrograde analysis over the move graph that GameState's move generation gives: the
+checkmates are lost in 0, a position with a move to a lost position is won one ply later, a position whose moves
+all go to won positions is lost one ply after the slowest of them, and whatever is left is a draw.
+Promotions in KPK go to the KQK and KRK tables, so those are generated first. Generate the tables from the Chess
+folder with:
+    python Tablebase.py [KQK KRK KPK] [--directory tablebases]
+They are looked up through mmap, a probe is a few index calculations and one byte read.
+"""
+import argparse
+import mmap
+import os
+import time
+from array import array
+import ChessEngine
+from ChessEngine import EMPTY, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, WHITE, BLACK, SQUARE_64, TYPE_MASK
+from ChessEngine import SQUARE_MASK, PIECE_MASK, PROMOTION_SHIFT, END_SHIFT, MOVED_SHIFT, CAPTURED_MASK
+
+TABLE_PIECES = {"KQK": QUEEN, "KRK": ROOK, "KPK": PAWN} #in generation order
+TABLE_SIZE = 2 * 64 * 64 * 64 #side to move, white king, black king, piece
+DEFAULT_DIRECTORY = "tablebases"
+DRAW = 0
+LOSS = 128
+NON_KING_PIECES = [color | pieceType for color in (WHITE, BLACK) for pieceType in (PAWN, KNIGHT, BISHOP, ROOK, QUEEN)]
+
+#results of a probe, for the side to move
+WIN_RESULT, DRAW_RESULT, LOSS_RESULT = 1, 0, -1
+
+
+"""
+Index of a placement in a table, the squares are 8x8 indexes (row * 8 + col)
+"""
+def table_index(whiteToMove, whiteKing, blackKing, pieceSq):
+    return (((0 if whiteToMove else 1) * 64 + whiteKing) * 64 + blackKing) * 64 + pieceSq
+
+"""
+Turns a table byte into (result, plies to mate) for the side to move
+"""
+def decode_value(value):
+    if value == DRAW:
+        return DRAW_RESULT, 0
+    if value < LOSS:
+        return WIN_RESULT, value
+    return LOSS_RESULT, value - LOSS
+
+"""
+Builds the table of one material combination and returns it as a bytearray. finishedTables holds the tables
+already generated by name, KPK needs KQK and KRK for its promotions.
+"""
+def generate_table(name, finishedTables, verbose=True):
+    pieceType = TABLE_PIECES[name]
+    piece = WHITE | pieceType
+    startTime = time.perf_counter()
+    gs = ChessEngine.GameState()
+    gs.currentCastlingRights = ChessEngine.CastleRights(False, False, False, False)
+    gs.enpassantPossible = ()
+    pieces = [EMPTY] * 64
+
+    values = bytearray(TABLE_SIZE)
+    resolved = bytearray(TABLE_SIZE)
+    drawExit = bytearray(TABLE_SIZE) #the position has a move to a draw outside of the table
+    childCounts = array('H', bytes(2 * TABLE_SIZE)) #moves to positions in the table that aren't resolved yet
+    successorStarts = array('I', bytes(4 * (TABLE_SIZE + 1)))
+    successors = array('I')
+    checkmates = []
+    exitWins = {} #ply -> positions with a move out of the table that mates in that many plies
+    exitChildWins = {} #ply -> positions with a move out of the table after which the opponent mates in that many plies
+
+    #forward pass: the moves of every legal position
+    for index in range(TABLE_SIZE):
+        successorStarts[index] = len(successors)
+        pieceSq = index % 64
+        blackKing = index // 64 % 64
+        whiteKing = index // 4096 % 64
+        whiteToMove = index < TABLE_SIZE // 2
+        if whiteKing == blackKing or pieceSq == whiteKing or pieceSq == blackKing:
+            continue
+        if pieceType == PAWN and pieceSq // 8 in (0, 7):
+            continue
+        pieces[whiteKing] = WHITE | KING
+        pieces[blackKing] = BLACK | KING
+        pieces[pieceSq] = piece
+        gs.load_squares(pieces)
+        pieces[whiteKing] = pieces[blackKing] = pieces[pieceSq] = EMPTY
+        #the side that just moved can't be left in check
+        if whiteToMove and gs.square_under_attack(gs.blackKingSquare, BLACK):
+            continue
+        if not whiteToMove and gs.square_under_attack(gs.whiteKingSquare, WHITE):
+            continue
+        gs.whiteToMove = whiteToMove
+        validMoves = gs.get_valid_moves()
+        if not validMoves:
+            if gs.checkMate:
+                resolved[index] = 1
+                values[index] = LOSS
+                checkmates.append(index)
+            else: #stalemate
+                resolved[index] = 1
+            continue
+        children = 0
+        for move in validMoves:
+            endSq = SQUARE_64[move >> END_SHIFT & SQUARE_MASK]
+            pieceMoved = move >> MOVED_SHIFT & PIECE_MASK
+            promotedType = move >> PROMOTION_SHIFT & TYPE_MASK
+            if move & CAPTURED_MASK: #the lone king takes the piece
+                drawExit[index] = 1
+            elif promotedType != EMPTY:
+                if promotedType == QUEEN or promotedType == ROOK:
+                    otherTable = finishedTables["KQK" if promotedType == QUEEN else "KRK"]
+                    result, plies = decode_value(otherTable[table_index(False, whiteKing, blackKing, endSq)])
+                else:
+                    result, plies = DRAW_RESULT, 0 #a bishop or knight can't mate
+                if result == LOSS_RESULT: #black is mated after the promotion
+                    exitWins.setdefault(plies + 1, []).append(index)
+                elif result == WIN_RESULT:
+                    exitChildWins.setdefault(plies, []).append(index)
+                    children += 1
+                else:
+                    drawExit[index] = 1
+            else:
+                if pieceMoved == WHITE | KING:
+                    child = table_index(not whiteToMove, endSq, blackKing, pieceSq)
+                elif pieceMoved == BLACK | KING:
+                    child = table_index(not whiteToMove, whiteKing, endSq, pieceSq)
+                else:
+                    child = table_index(not whiteToMove, whiteKing, blackKing, endSq)
+                successors.append(child)
+                children += 1
+        childCounts[index] = children
+    successorStarts[TABLE_SIZE] = len(successors)
+    if verbose:
+        print(f"{name}: {len(successors)} moves generated in {time.perf_counter() - startTime:.1f}s")
+
+    #predecessor lists, the same moves the other way around
+    predecessorStarts = array('I', bytes(4 * (TABLE_SIZE + 1)))
+    for child in successors:
+        predecessorStarts[child + 1] += 1
+    for index in range(TABLE_SIZE):
+        predecessorStarts[index + 1] += predecessorStarts[index]
+    fill = array('I', predecessorStarts)
+    predecessors = array('I', bytes(4 * len(successors)))
+    for index in range(TABLE_SIZE):
+        for i in range(successorStarts[index], successorStarts[index + 1]):
+            child = successors[i]
+            predecessors[fill[child]] = index
+            fill[child] += 1
+    del successors, fill
+
+    #retrograde pass, one ply at a time so the first time a position is resolved is at its distance to mate
+    frontier = checkmates
+    plies = 0
+    while frontier or exitWins or exitChildWins:
+        nextFrontier = []
+        for index in exitWins.pop(plies, []):
+            if not resolved[index]:
+                resolved[index] = 1
+                values[index] = plies
+                frontier.append(index)
+        for index in exitChildWins.pop(plies, []):
+            if not resolved[index]:
+                childCounts[index] -= 1
+                if childCounts[index] == 0 and not drawExit[index]:
+                    resolved[index] = 1
+                    values[index] = LOSS + plies + 1
+                    nextFrontier.append(index)
+        for index in frontier:
+            lost = values[index] >= LOSS
+            for i in range(predecessorStarts[index], predecessorStarts[index + 1]):
+                parent = predecessors[i]
+                if resolved[parent]:
+                    continue
+                if lost: #the parent can move into a lost position
+                    resolved[parent] = 1
+                    values[parent] = plies + 1
+                    nextFrontier.append(parent)
+                else:
+                    childCounts[parent] -= 1
+                    if childCounts[parent] == 0 and not drawExit[parent]:
+                        resolved[parent] = 1
+                        values[parent] = LOSS + plies + 1
+                        nextFrontier.append(parent)
+        frontier = nextFrontier
+        plies += 1
+    if verbose:
+        wins = sum(1 for value in values if 0 < value < LOSS)
+        print(f"{name}: longest mate {plies - 1} plies, {wins} won positions, {time.perf_counter() - startTime:.1f}s")
+    return values
+
+"""
+Generates the tables and writes them to directory as <name>.tb
+"""
+def generate_tables(names, directory=DEFAULT_DIRECTORY):
+    os.makedirs(directory, exist_ok=True)
+    finishedTables = {}
+    for name in TABLE_PIECES:
+        path = os.path.join(directory, name + ".tb")
+        if name in names:
+            finishedTables[name] = generate_table(name, finishedTables)
+        elif "KPK" in names and name != "KPK": #KPK promotes into the other tables
+            if os.path.exists(path):
+                with open(path, "rb") as tableFile:
+                    finishedTables[name] = tableFile.read()
+                continue
+            finishedTables[name] = generate_table(name, finishedTables)
+        else:
+            continue
+        with open(path, "wb") as tableFile:
+            tableFile.write(finishedTables[name])
+
+
+class Tablebases():
+    def __init__(self, directory=DEFAULT_DIRECTORY):
+        self.tables = {} #piece type -> mmap of its table
+        self.files = []
+        for name, pieceType in TABLE_PIECES.items():
+            path = os.path.join(directory, name + ".tb")
+            if os.path.exists(path) and os.path.getsize(path) == TABLE_SIZE:
+                tableFile = open(path, "rb")
+                self.files.append(tableFile)
+                self.tables[pieceType] = mmap.mmap(tableFile.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        for table in self.tables.values():
+            table.close()
+        for tableFile in self.files:
+            tableFile.close()
+        self.tables = {}
+        self.files = []
+
+    '''
+    Returns (result, plies to mate) for the side to move, or None if the position isn't covered: more than one
+    piece besides the kings, no table for the piece, or castling rights left. A lone king or a king with a bishop or
+    knight is a draw without a table.
+    '''
+    def probe(self, gs):
+        bitboards = gs.bitboards
+        piece = EMPTY
+        for otherPiece in NON_KING_PIECES:
+            pieceBits = bitboards[otherPiece]
+            if pieceBits:
+                if piece != EMPTY or pieceBits & (pieceBits - 1):
+                    return None
+                piece = otherPiece
+        pieceType = piece & TYPE_MASK
+        if piece == EMPTY or pieceType == BISHOP or pieceType == KNIGHT:
+            return DRAW_RESULT, 0
+        table = self.tables.get(pieceType)
+        castleRights = gs.currentCastlingRights
+        if table is None or castleRights.wks or castleRights.wqs or castleRights.bks or castleRights.bqs:
+            return None
+        pieceSq = bitboards[piece].bit_length() - 1
+        whiteKing = SQUARE_64[gs.whiteKingSquare]
+        blackKing = SQUARE_64[gs.blackKingSquare]
+        if piece & WHITE:
+            index = table_index(gs.whiteToMove, whiteKing, blackKing, pieceSq)
+        else: #mirror the board so the piece is white, ^ 56 flips the row of an 8x8 index
+            index = table_index(not gs.whiteToMove, blackKing ^ 56, whiteKing ^ 56, pieceSq ^ 56)
+        return decode_value(table[index])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate endgame tablebases")
+    #checked here instead of with choices, which argparse also applies to the empty list of no tables given
+    parser.add_argument("tables", nargs="*", help="tables to generate out of " + " ".join(TABLE_PIECES) + ", default all")
+    parser.add_argument("--directory", default=DEFAULT_DIRECTORY)
+    args = parser.parse_args()
+    unknown = [name for name in args.tables if name not in TABLE_PIECES]
+    if unknown:
+        parser.error("unknown tables: " + " ".join(unknown))
+    generate_tables(args.tables or list(TABLE_PIECES), args.directory)
+
+
+if __name__ == "__main__":
+    main()
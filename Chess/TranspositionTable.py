@@ -0,0 +1,100 @@
+"""
+Transposition table used by the search to remember positions it has already searched.
+Positions are keyed by GameState.zobristKey. Every bucket has two slots: a depth-preferred slot that keeps
+the deepest search of a position and an always-replace slot that keeps the most recent one.
+"""
+
+#bound types of a stored score
+EXACT = 0 #score is the exact value of the position
+LOWER_BOUND = 1 #search failed high, the real score is at least this
+UPPER_BOUND = 2 #search failed low, the real score is at most this
+
+#approximate number of bytes one stored entry costs in CPython: the 5-tuple, the 64-bit key,
+#the float score, the move id and the list slot pointing to it
+ENTRY_SIZE = 176
+
+
+class TranspositionTable():
+    def __init__(self, sizeMB=32):
+        self.resize(sizeMB)
+
+    '''
+    Allocates an empty table that uses at most about sizeMB megabytes
+    '''
+    def resize(self, sizeMB):
+        self.sizeMB = sizeMB
+        self.numBuckets = max(1, int(sizeMB * 1024 * 1024) // (2 * ENTRY_SIZE))
+        self.clear()
+
+    '''
+    Removes every entry and resets the counters
+    '''
+    def clear(self):
+        self.depthPreferred = [None] * self.numBuckets
+        self.alwaysReplace = [None] * self.numBuckets
+        self.reset_counters()
+
+    def reset_counters(self):
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.overwrites = 0 #stores that threw away the entry of a different position
+
+    '''
+    Returns the entry (key, depth, score, bound, bestMoveID) stored for the position or None
+    '''
+    def probe(self, key):
+        index = key % self.numBuckets
+        entry = self.depthPreferred[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        entry = self.alwaysReplace[index]
+        if entry is not None and entry[0] == key:
+            self.hits += 1
+            return entry
+        self.misses += 1
+        return None
+
+    '''
+    Stores the result of a search of the given depth. A result at least as deep as the one in the
+    depth-preferred slot takes that slot and pushes the old entry to the always-replace slot,
+    shallower results go straight to the always-replace slot.
+    '''
+    def store(self, key, depth, score, bound, bestMoveID):
+        index = key % self.numBuckets
+        entry = (key, depth, score, bound, bestMoveID)
+        self.stores += 1
+        deepEntry = self.depthPreferred[index]
+        if deepEntry is None or deepEntry[0] == key or depth >= deepEntry[1]:
+            self.depthPreferred[index] = entry
+            if deepEntry is not None and deepEntry[0] != key:
+                self.push_always_replace(index, deepEntry)
+        else:
+            self.push_always_replace(index, entry)
+
+    def push_always_replace(self, index, entry):
+        oldEntry = self.alwaysReplace[index]
+        if oldEntry is not None and oldEntry[0] != entry[0]:
+            self.overwrites += 1
+        self.alwaysReplace[index] = entry
+
+    '''
+    Returns the best move id stored for the position without touching the counters
+    '''
+    def get_best_move_id(self, key):
+        index = key % self.numBuckets
+        for entry in (self.depthPreferred[index], self.alwaysReplace[index]):
+            if entry is not None and entry[0] == key:
+                return entry[4]
+        return None
+
+    '''
+    Per mille of the sampled slots that are in use
+    '''
+    def hashfull(self):
+        sample = min(1000, self.numBuckets)
+        used = 0
+        for i in range(sample):
+            used += (self.depthPreferred[i] is not None) + (self.alwaysReplace[i] is not None)
+        return used * 1000 // (2 * sample)
@@ -0,0 +1,210 @@
+"""
+Headless UCI (Universal Chess Interface) front end, so the engine can run under chess GUIs, tournament managers and
+servers without a display. It reads commands on stdin and answers on stdout and never imports pygame.
+Run from the Chess folder:
+    python UciEngine.py
+Supported commands: uci, isready, ucinewgame, setoption name Hash value N, position [startpos | fen ...] [moves ...],
+go [depth N] [movetime MS] [nodes N] [wtime MS] [btime MS] [winc MS] [binc MS] [movestogo N] [infinite], stop, quit.
+The search runs on its own thread so stop and isready are answered while it thinks.
+"""
+import sys
+import threading
+import time
+import ChessEngine
+import SmartMoveFinder
+
+ENGINE_NAME = "Chess-Game-Engine"
+ENGINE_AUTHOR = "andrew2117"
+DEFAULT_MOVES_TO_GO = 30 #moves the remaining clock time is shared over when the GUI doesn't say
+MOVE_OVERHEAD = 0.05 #seconds kept back on every move for the communication with the GUI
+
+
+class UciEngine():
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock() #the search thread and the command loop both write
+        self.gs = ChessEngine.GameState()
+        self.searchThread = None
+        self.stopEvent = threading.Event()
+        self.searchStartTime = 0
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    '''
+    Handles one command line, returns False after quit
+    '''
+    def handle_command(self, line):
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send(f"option name Hash type spin default {SmartMoveFinder.TT_SIZE_MB} min 1 max 4096")
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stop_search()
+            SmartMoveFinder.transpositionTable.clear()
+            SmartMoveFinder.historyTable.clear()
+            self.gs = ChessEngine.GameState()
+        elif command == "setoption":
+            self.set_option(tokens[1:])
+        elif command == "position":
+            self.stop_search()
+            self.set_position(tokens[1:])
+        elif command == "go":
+            self.stop_search()
+            self.go(tokens[1:])
+        elif command == "stop":
+            self.stop_search()
+        elif command == "quit":
+            self.stop_search()
+            return False
+        return True
+
+    def set_option(self, tokens):
+        if "name" in tokens and "value" in tokens:
+            name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")])
+            value = " ".join(tokens[tokens.index("value") + 1:])
+            if name.lower() == "hash":
+                try:
+                    SmartMoveFinder.transpositionTable.resize(int(value))
+                except ValueError:
+                    self.send("info string Hash needs a number of megabytes: " + value)
+
+    '''
+    position startpos [moves ...] or position fen <fen> [moves ...]
+    '''
+    def set_position(self, tokens):
+        movesIndex = tokens.index("moves") if "moves" in tokens else len(tokens)
+        try:
+            if tokens and tokens[0] == "fen":
+                gs = ChessEngine.GameState.from_fen(" ".join(tokens[1:movesIndex]))
+            else:
+                gs = ChessEngine.GameState()
+        except ValueError as e:
+            self.send("info string " + str(e))
+            return
+        for notation in tokens[movesIndex + 1:]:
+            move = next((m for m in gs.get_valid_move_objects() if m.get_chess_notation() == notation), None)
+            if move is None:
+                self.send("info string illegal move " + notation)
+                break
+            gs.make_move(move)
+        self.gs = gs
+
+    '''
+    Starts the search on its own thread with the limits of the go command. After go infinite, or a go without any
+    limit, the bestmove is held back until stop.
+    '''
+    def go(self, tokens):
+        limits = {}
+        for i in range(len(tokens) - 1):
+            if tokens[i] in ("depth", "movetime", "nodes", "wtime", "btime", "winc", "binc", "movestogo"):
+                try:
+                    limits[tokens[i]] = int(tokens[i + 1])
+                except ValueError:
+                    pass
+        maxDepth = limits.get("depth", SmartMoveFinder.MAX_PLY // 2)
+        timeLimit = None
+        if "movetime" in limits:
+            timeLimit = limits["movetime"] / 1000
+        elif "infinite" not in tokens:
+            clock = limits.get("wtime" if self.gs.whiteToMove else "btime")
+            if clock is not None:
+                timeLimit = self.time_for_move(clock / 1000, limits.get("winc" if self.gs.whiteToMove else "binc", 0) / 1000,
+                                               limits.get("movestogo", DEFAULT_MOVES_TO_GO))
+        waitForStop = "infinite" in tokens or (timeLimit is None and "depth" not in limits and "nodes" not in limits)
+        self.stopEvent.clear()
+        self.searchThread = threading.Thread(target=self.search, args=(maxDepth, timeLimit, limits.get("nodes"), waitForStop),
+                                             daemon=True)
+        self.searchThread.start()
+
+    '''
+    Seconds to spend on this move: an equal share of the clock over the moves to go plus most of the increment,
+    never more than half of what is left on the clock
+    '''
+    @staticmethod
+    def time_for_move(clock, increment, movesToGo):
+        budget = clock / max(movesToGo, 1) + increment * 0.8
+        return max(0.01, min(budget, clock / 2) - MOVE_OVERHEAD)
+
+    def search(self, maxDepth, timeLimit, nodeLimit, waitForStop=False):
+        gs = self.gs
+        validMoves = gs.get_valid_moves()
+        if not validMoves:
+            self.send_best_move("0000", waitForStop)
+            return
+        bookMove = SmartMoveFinder.find_book_move(gs, validMoves)
+        if bookMove is not None:
+            self.send("info string book move")
+            self.send_best_move(bookMove.get_chess_notation(), waitForStop)
+            return
+        tablebaseMove = SmartMoveFinder.find_tablebase_move(gs, validMoves) #the same root probe as find_best_move
+        if tablebaseMove is not None:
+            self.send("info string tablebase move")
+            self.send_best_move(ChessEngine.Move.from_code(tablebaseMove).get_chess_notation(), waitForStop)
+            return
+        self.searchStartTime = time.perf_counter()
+        SmartMoveFinder.stopSignal = self.stopEvent.is_set
+        SmartMoveFinder.infoCallback = self.send_info
+        try:
+            bestMove, score, pv = SmartMoveFinder.iterative_deepening(gs, validMoves, maxDepth, timeLimit, nodeLimit)
+        finally:
+            SmartMoveFinder.stopSignal = None
+            SmartMoveFinder.infoCallback = None
+        if bestMove is None:
+            bestMove = ChessEngine.Move.from_code(validMoves[0])
+        self.send("info string " + str(SmartMoveFinder.lastSearchStats))
+        self.send_best_move(bestMove.get_chess_notation(), waitForStop)
+
+    '''
+    Sends the bestmove, after stop when waitForStop is True: in infinite mode the GUI has to end the search even if
+    it finished on its own, a mate for example
+    '''
+    def send_best_move(self, notation, waitForStop):
+        if waitForStop:
+            self.stopEvent.wait()
+        self.send("bestmove " + notation)
+
+    '''
+    info line of a completed iteration, the score is in centipawns for the side to move, or mate in moves, negative
+    when the side to move gets mated, from the plies to the mate the search score counts
+    '''
+    def send_info(self, depth, score, nodes, principalVariation):
+        elapsed = max(time.perf_counter() - self.searchStartTime, 1e-6)
+        if abs(score) >= SmartMoveFinder.MATE_THRESHOLD:
+            mateIn = (round(SmartMoveFinder.CHECKMATE - abs(score)) + 1) // 2
+            scoreText = "mate " + str(mateIn if score > 0 else -mateIn)
+        else:
+            scoreText = "cp " + str(round(score * 100))
+        pv = " ".join(move.get_chess_notation() for move in principalVariation)
+        self.send(f"info depth {depth} score {scoreText} nodes {nodes} nps {int(nodes / elapsed)} "
+                  f"time {int(elapsed * 1000)} pv {pv}")
+
+    '''
+    Stops a running search and waits for it to send its bestmove
+    '''
+    def stop_search(self):
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle_command(line):
+            break
+    engine.stop_search()
+
+
+if __name__ == "__main__":
+    main()